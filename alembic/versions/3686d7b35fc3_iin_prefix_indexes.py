@@ -0,0 +1,32 @@
+"""IIN prefix indexes
+
+Revision ID: 3686d7b35fc3
+Revises: bd9837c35a21
+Create Date: 2026-10-17 15:21:08.640517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3686d7b35fc3'
+down_revision: Union[str, None] = 'bd9837c35a21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Range scans by IIN prefix ('~>=~', '~<~'), independent of the DB collation.
+    # Indexes are built CONCURRENTLY, so writes to the tables aren't blocked during the build. It can't run inside
+    # a transaction. If the build fails, the invalid index must be dropped before running the migration again.
+    with op.get_context().autocommit_block():
+        for table in ['patients', 'doctors']:
+            op.execute(f'CREATE INDEX CONCURRENTLY "ix_{table}_IIN_pattern" ON {table} ("IIN" varchar_pattern_ops)')
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for table in ['patients', 'doctors']:
+            op.execute(f'DROP INDEX CONCURRENTLY "ix_{table}_IIN_pattern"')
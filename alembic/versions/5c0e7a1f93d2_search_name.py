@@ -0,0 +1,83 @@
+"""search name
+
+Revision ID: 5c0e7a1f93d2
+Revises: 3686d7b35fc3
+Create Date: 2026-10-17 16:42:10.318746
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.transliteration import search_name
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c0e7a1f93d2'
+down_revision: Union[str, None] = '3686d7b35fc3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+TABLES = ['patients', 'doctors']
+
+
+def backfill(table_name: str) -> None:
+    # Rows without 'search_name' are read by ranges of the primary key, and every range is updated by a single
+    # 'UPDATE ... FROM (VALUES ...)' statement.
+    connection = op.get_bind()
+    table = sa.table(table_name, sa.column('id', sa.Integer), sa.column('first_name', sa.String),
+                     sa.column('last_name', sa.String), sa.column('middle_name', sa.String),
+                     sa.column('search_name', sa.String))
+    select_batch = sa.select(table.c.id, table.c.first_name, table.c.last_name, table.c.middle_name). \
+        where(table.c.id > sa.bindparam('last_id'), table.c.search_name.is_(None)). \
+        order_by(table.c.id). \
+        limit(BATCH_SIZE)
+
+    last_id = 0
+    while True:
+        rows = connection.execute(select_batch, {'last_id': last_id}).all()
+        if not rows:
+            break
+
+        batch = sa.values(sa.column('id', sa.Integer), sa.column('search_name', sa.String), name='batch'). \
+            data([(row.id, search_name(row.first_name, row.last_name, row.middle_name)) for row in rows])
+        connection.execute(
+            sa.update(table).where(table.c.id == batch.c.id).values(search_name=batch.c.search_name)
+        )
+        last_id = rows[-1].id
+
+
+def upgrade() -> None:
+    # A nullable column without a default is added by a change of the catalog only, the lock is held for a moment.
+    for table in TABLES:
+        op.add_column(table, sa.Column('search_name', sa.String(), nullable=True))
+
+    # Outside of the migration transaction every batch is committed by itself, so row locks are held for one batch
+    # only. Indexes are built CONCURRENTLY, so writes to the tables aren't blocked during the build. If the build
+    # fails, the invalid index must be dropped before running the migration again.
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            backfill(table)
+
+        for table in TABLES:
+            op.execute(f'CREATE INDEX CONCURRENTLY ix_{table}_search_name_trgm ON {table} '
+                       f'USING gin (search_name gin_trgm_ops)')
+
+    # Rows written by the previous version of the application during the backfill are filled under a lock blocking
+    # writes (but not reads), then the column is checked for NULLs (a scan, the table isn't rewritten).
+    for table in TABLES:
+        op.execute(f'LOCK TABLE {table} IN EXCLUSIVE MODE')
+        backfill(table)
+        op.alter_column(table, 'search_name', nullable=False)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            op.execute(f'DROP INDEX CONCURRENTLY ix_{table}_search_name_trgm')
+
+    for table in TABLES:
+        op.drop_column(table, 'search_name')
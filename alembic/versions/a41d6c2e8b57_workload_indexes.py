@@ -0,0 +1,35 @@
+"""workload indexes
+
+Revision ID: a41d6c2e8b57
+Revises: 5c0e7a1f93d2
+Create Date: 2026-10-17 17:35:52.904162
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a41d6c2e8b57'
+down_revision: Union[str, None] = '5c0e7a1f93d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Indexes are built CONCURRENTLY, so writes to the tables aren't blocked during the build. It can't run inside
+    # a transaction. If the build fails, the invalid index must be dropped before running the migration again.
+    with op.get_context().autocommit_block():
+        op.create_index('ix_patients_doctor_id_id', 'patients', ['doctor_id', 'id'], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index('ix_refresh_tokens_revoked_expires_at', 'refresh_tokens', ['expires_at'], unique=False,
+                        postgresql_where=sa.text('revoked_at IS NOT NULL'), postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_refresh_tokens_revoked_expires_at', table_name='refresh_tokens',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_patients_doctor_id_id', table_name='patients', postgresql_concurrently=True)
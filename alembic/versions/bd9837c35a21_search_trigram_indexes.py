@@ -0,0 +1,27 @@
+"""search trigram indexes
+
+Revision ID: bd9837c35a21
+Revises: 158ae140e864
+Create Date: 2026-10-17 14:03:27.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'bd9837c35a21'
+down_revision: Union[str, None] = '158ae140e864'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    # Trigram indexes of names are built on the stored 'search_name' column by the 'search_name' migration.
+    # IIN is searched by prefix only, by the 'IIN_pattern' indexes of the 'IIN_prefix_indexes' migration.
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+
+def downgrade() -> None:
+    # The extension is kept, other objects of the database may use it.
+    pass
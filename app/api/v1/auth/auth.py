@@ -1,22 +1,36 @@
+import hashlib
 from datetime import datetime
 from typing import Tuple
 
 from fastapi import HTTPException
+from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, ExpiredSignatureError
-from sqlalchemy import select
+from sqlalchemy import select, Select, Row, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from passlib.context import CryptContext
 
-from app.config.env_config import SECRET_KEY, ALGORITHM
+from app.api.v1.auth.jwt.token_schema import Principal
+from app.api.v1.auth.password import verify_password, hash_password
+from app.api.v1.auth.throttling import login_gate
+from app.api.v1.services.cache.cache_service import TTLCache
+from app.api.v1.services.metrics.metrics_service import metrics
+from app.config.env_config import SECRET_KEY, ALGORITHM, VERIFIED_TOKEN_CACHE_SIZE, UNKNOWN_USER_CACHE_SIZE, \
+    UNKNOWN_USER_CACHE_TTL_SECONDS
+from app.config.database import async_session_maker, after_commit
 from app.models.models import Patient, Doctor, Admin
-from app.schemas.schemas import PatientRead, DoctorRead, AdminRead
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
+
+# Payloads of already verified tokens, keyed by SHA-256 digest of the token. Entries expire at the token's 'exp'.
+verified_tokens = TTLCache("auth.verified_tokens", VERIFIED_TOKEN_CACHE_SIZE)
+
+# (user role, username or IIN) pairs which were not found in the DB during login.
+unknown_users = TTLCache("auth.unknown_users", UNKNOWN_USER_CACHE_SIZE, ttl=UNKNOWN_USER_CACHE_TTL_SECONDS)
 
 
 def verify_token(token: str) -> dict:
     """
-    This function verifies the validity of a JWT token.
+    This function verifies the validity of a JWT token. Payloads of verified tokens are cached until the token
+    expires, so repeated calls with the same token skip decoding and signature check.
 
     Args:
         token (str): The JWT token to verify.
@@ -27,8 +41,14 @@ def verify_token(token: str) -> dict:
     Raises:
         ExpiredSignatureError: If the token is expired.
         JWTClaimsError: If the token has invalid claims.
+        HTTPException (401): If the token is not an access token.
     """
 
+    token_digest = hashlib.sha256(token.encode()).digest()
+    payload = verified_tokens.get(token_digest)
+    if payload is not None:
+        return payload
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         if datetime.now() > datetime.fromtimestamp(payload['exp']):
@@ -38,75 +58,117 @@ def verify_token(token: str) -> dict:
     except jwt.JWTClaimsError:
         raise HTTPException(status_code=401, detail="Invalid token claims")
 
+    if payload.get("token_type") != "access":
+        raise HTTPException(status_code=401, detail="Invalid token type")
+
+    verified_tokens.set(token_digest, payload, expires_at=payload['exp'])
+
     return payload
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+def forbid_roles(principal: Principal, forbidden_roles: list[str]) -> None:
     """
-    This method is used to verify the identity of the raw and encrypted password in the DB.
+    This function checks that the authenticated user doesn't have one of the forbidden roles.
 
-    Returns:
-        True or False (bool)
+    Raises:
+        HTTPException (403): If the user's role is forbidden.
     """
 
-    return pwd_context.verify(plain_password, hashed_password)
+    if principal.user_role in forbidden_roles:
+        raise HTTPException(status_code=403, detail="Forbidden: Unauthorized role")
 
 
-async def authenticate_patient(patient_IIN: str, patient_raw_password: str, session: AsyncSession) -> PatientRead | bool:
+def forget_unknown_user(session: AsyncSession, user_role: str, username: str) -> None:
     """
-    This method is used to authenticate a patient by checking theirs presence in the DB and verifying raw password
-    with hashed password in the DB.
-
-    Returns:
-        patient or False (PatientRead | bool)
+    This function removes the user from the cache of unknown usernames, once the current transaction of the session
+    is committed. It must be called when a user with given username (or IIN) appears in the DB. Until the commit
+    a login can't see the user yet and may cache the username as unknown again.
     """
 
-    data = await session.execute(select(Patient).where(Patient.IIN == patient_IIN))
-    patient = data.scalars().first()
+    after_commit(session, lambda: unknown_users.invalidate((user_role, username)))
+
 
-    if not patient:
+async def _authenticate(user_role: str, username: str, raw_password: str, query: Select, session: AsyncSession) \
+        -> Row | bool:
+    if unknown_users.get((user_role, username)):
         return False
-    if not verify_password(patient_raw_password, patient.hashed_password):
+
+    data = await session.execute(query)
+    user = data.first()
+
+    if not user:
+        unknown_users.set((user_role, username), True)
         return False
+    async with login_gate.admit():
+        if not await verify_password(raw_password, user.hashed_password):
+            return False
 
-    return patient
+    return user
 
 
-async def authenticate_doctor(doctor_IIN: str, doctor_raw_password: str, session: AsyncSession) -> DoctorRead | bool:
+async def authenticate_patient(patient_IIN: str, patient_raw_password: str, session: AsyncSession) -> Row | bool:
     """
-    This method is used to authenticate a doctor by checking theirs presence in the DB and verifying raw password
-    with hashed password in the DB.
+    This method is used to authenticate a patient by checking theirs presence in the DB and verifying raw password
+    with hashed password in the DB. Only the columns needed for login are loaded.
 
     Returns:
-        doctor or False (DoctorRead | bool)
+        patient's (id, IIN, hashed_password, doctor_id) or False (Row | bool)
     """
 
-    data = await session.execute(select(Doctor).where(Doctor.IIN == doctor_IIN))
-    doctor = data.scalars().first()
+    query = select(Patient.id, Patient.IIN, Patient.hashed_password, Patient.doctor_id).\
+        where(Patient.IIN == patient_IIN)
 
-    if not doctor:
-        return False
-    if not verify_password(doctor_raw_password, doctor.hashed_password):
-        return False
+    return await _authenticate("Patient", patient_IIN, patient_raw_password, query, session)
 
-    return doctor
 
+async def authenticate_doctor(doctor_IIN: str, doctor_raw_password: str, session: AsyncSession) -> Row | bool:
+    """
+    This method is used to authenticate a doctor by checking theirs presence in the DB and verifying raw password
+    with hashed password in the DB. Only the columns needed for login are loaded.
 
-async def authenticate_admin(admin_username: str, admin_raw_password: str, session: AsyncSession) -> AdminRead | bool:
+    Returns:
+        doctor's (id, IIN, hashed_password) or False (Row | bool)
+    """
+
+    query = select(Doctor.id, Doctor.IIN, Doctor.hashed_password).where(Doctor.IIN == doctor_IIN)
+
+    return await _authenticate("Doctor", doctor_IIN, doctor_raw_password, query, session)
+
+
+async def authenticate_admin(admin_username: str, admin_raw_password: str, session: AsyncSession) -> Row | bool:
     """
     This method is used to authenticate an admin by checking theirs presence in the DB and verifying raw password
-    with hashed password in the DB.
+    with hashed password in the DB. Only the columns needed for login are loaded.
 
     Returns:
-        admin or False (AdminRead | bool)
+        admin's (id, username, hashed_password) or False (Row | bool)
     """
 
-    data = await session.execute(select(Admin).where(Admin.username == admin_username))
-    admin = data.scalars().first()
+    query = select(Admin.id, Admin.username, Admin.hashed_password).where(Admin.username == admin_username)
 
-    if not admin:
-        return False
-    if not verify_password(admin_raw_password, admin.hashed_password):
-        return False
+    return await _authenticate("Admin", admin_username, admin_raw_password, query, session)
+
+
+async def rehash_user_password(user_role: str, user_id: int, raw_password: str, old_hashed_password: str) -> None:
+    """
+    This method is used to replace the outdated password hash of the user (for example, after BCRYPT_ROUNDS was
+    changed). It's run as a background task after a successful login, so it doesn't delay the response.
+    The hash is replaced only if it's still the one verified at login, so a password changed in the meantime
+    isn't reverted.
+    """
+
+    user_model = {"Patient": Patient, "Doctor": Doctor, "Admin": Admin}[user_role]
+    hashed_password = await hash_password(raw_password)
+
+    async with async_session_maker() as session:
+        query = update(user_model). \
+            where(user_model.id == user_id, user_model.hashed_password == old_hashed_password). \
+            values(hashed_password=hashed_password)
+        data = await session.execute(query)
+        await session.commit()
+
+    if data.rowcount == 0:
+        metrics.increment("auth.password_rehash_skipped")
+        return
 
-    return admin
+    metrics.increment("auth.passwords_rehashed")
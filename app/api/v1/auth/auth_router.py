@@ -1,14 +1,21 @@
+import uuid
 from datetime import timedelta, datetime
 
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
+from fastapi import APIRouter, Depends, HTTPException, Request, BackgroundTasks
+from fastapi.security import OAuth2PasswordRequestForm
 from jose import jwt, JWTError
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
-from app.api.v1.auth.auth import authenticate_patient, authenticate_doctor, authenticate_admin
+from app.api.v1.auth.auth import authenticate_patient, authenticate_doctor, authenticate_admin, oauth2_scheme, \
+    rehash_user_password
+from app.api.v1.auth.jwt.revocation import revoked_tokens
 from app.api.v1.auth.jwt.token import create_token
 from app.api.v1.auth.jwt.token_schema import Token
+from app.api.v1.auth.password import password_needs_update
+from app.api.v1.auth.throttling import client_throttle, username_throttle
+from app.api.v1.repositories.refresh_token_repository import RefreshTokenRepository
+from app.config.database import after_commit
 from app.config.env_config import ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS, SECRET_KEY, ALGORITHM
 from app.dependencies import get_async_session
 
@@ -17,11 +24,11 @@ router = APIRouter(
     prefix="/api/v1/auth"
 )
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
-
 
 @router.post("/login", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), session: AsyncSession = Depends(get_async_session)):
+async def login_for_access_token(request: Request, background_tasks: BackgroundTasks,
+                                 form_data: OAuth2PasswordRequestForm = Depends(),
+                                 session: AsyncSession = Depends(get_async_session)):
     """
     This method is used to authenticate a user ('Patient', 'Doctor', or 'Admin' instance) by checking their presence
     in the DB and  verifying the raw password with the hashed password in the DB.
@@ -33,12 +40,18 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     Raises:
         HTTPException (400): If user's role was not given correctly.
         HTTPException (401): If user's data (username (or IIN)) doesn't math with DB data.
+        HTTPException (429): If there are too many login attempts for the username or from the client address.
+        HTTPException (503): If too many password checks are already waiting.
     """
 
     username = form_data.username
     password = form_data.password
     user_role = form_data.scopes[0]
 
+    # Throttling is checked before any DB access or password hashing.
+    client_throttle.check(request.client.host if request.client else None)
+    username_throttle.check(username)
+
     if user_role == "Patient":
         user = await authenticate_patient(username, password, session)
     elif user_role == "Doctor":
@@ -51,19 +64,16 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     if not user:
         raise HTTPException(status_code=401, detail="Incorrect username or password.")
 
-    user_auth_id = user.IIN if user_role in ["Patient", "Doctor"] else user.username
-
-    access_token_expires = timedelta(minutes=int(ACCESS_TOKEN_EXPIRE_MINUTES))
-    access_token = create_token(
-        data={"sub": user_auth_id, "user_role": user_role}, token_type="access", expires_delta=access_token_expires
-    )
+    # Hashes made with outdated settings are replaced after the response is sent.
+    if password_needs_update(user.hashed_password):
+        background_tasks.add_task(rehash_user_password, user_role, user.id, password, user.hashed_password)
 
-    refresh_token_expires = timedelta(days=int(REFRESH_TOKEN_EXPIRE_DAYS))
-    refresh_token = create_token(
-        data={"sub": user_auth_id, "user_role": user_role}, token_type="refresh", expires_delta=refresh_token_expires
-    )
+    user_auth_id = user.IIN if user_role in ["Patient", "Doctor"] else user.username
+    claims = {"sub": user_auth_id, "user_role": user_role, "user_id": user.id}
+    if user_role == "Patient":
+        claims["doctor_id"] = user.doctor_id
 
-    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+    return await issue_tokens(claims, session)
 
 
 credentials_exception = HTTPException(
@@ -73,28 +83,50 @@ credentials_exception = HTTPException(
 )
 
 
-@router.post("/refresh", response_model=Token)
-async def refresh_token(refresh_token_data: str = Depends(oauth2_scheme)):
+async def issue_tokens(claims: dict, session: AsyncSession) -> dict:
     """
-    This method is used to refresh the access token of a user. It takes the refresh token as input, verifies it,
-    and returns a new access token.
+    This method is used to create a pair of access and refresh tokens with the given claims. The refresh token gets
+    a unique 'jti' and is saved in the DB, so it can be rotated and revoked.
 
     Returns:
-        A dictionary containing the new access token, token type, and refresh token if the refresh token is valid.
+        A dictionary containing the access token, token type, and refresh token.
+    """
 
-    Raises:
-        HTTPException (401): If the refresh token is missing 'sub' or 'exp' in payload, or if the token is expired,
-        or if there is a JWTError while decoding the token.
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_token(
+        data=claims, token_type="access", expires_delta=access_token_expires
+    )
+
+    jti = str(uuid.uuid4())
+    refresh_token_expires = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    refresh_token = create_token(
+        data={**claims, "jti": jti}, token_type="refresh", expires_delta=refresh_token_expires
+    )
+    await RefreshTokenRepository(session).create_refresh_token(
+        jti, claims["sub"], claims["user_role"], datetime.now() + refresh_token_expires
+    )
+
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+
+async def revoke_refresh_token(refresh_token: str, session: AsyncSession) -> dict:
     """
+    This method is used to verify the refresh token and to revoke it, so it can't be used again.
+    Already revoked tokens are rejected by the in-memory revocation structure without a DB query.
 
-    refresh_token = refresh_token_data
+    Returns:
+        payload of the revoked refresh token (dict)
+
+    Raises:
+        HTTPException (401): If the refresh token is missing 'sub', 'jti' or 'exp' in payload, if it's not a refresh
+        token, if the token is expired or already revoked, or if there is a JWTError while decoding the token.
+    """
 
     try:
         payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
         user_auth_id = payload.get("sub")
-        user_role = payload.get("user_role")
 
-        if user_auth_id is None:
+        if user_auth_id is None or payload.get("token_type") != "refresh":
             raise credentials_exception
         token_expires = payload.get("exp")
 
@@ -107,15 +139,56 @@ async def refresh_token(refresh_token_data: str = Depends(oauth2_scheme)):
     except JWTError:
         raise credentials_exception
 
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_token(
-        data={"sub": user_auth_id, "user_role": user_role}, token_type="access", expires_delta=access_token_expires
-    )
+    jti = payload.get("jti")
+    if jti is None or jti in revoked_tokens:
+        raise credentials_exception
 
-    refresh_token_expires = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    refresh_token = create_token(
-        data={"sub": user_auth_id, "user_role": user_role}, token_type="refresh", expires_delta=refresh_token_expires
-    )
+    # Tokens revoked by another worker are not in memory, but the DB update only succeeds once.
+    expires_at = await RefreshTokenRepository(session).revoke_refresh_token(jti)
+    if expires_at is None:
+        raise credentials_exception
+    # The revocation is remembered only once it's committed with the rest of the request.
+    after_commit(session, lambda: revoked_tokens.add(jti, expires_at))
 
-    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+    return payload
+
+
+@router.post("/refresh", response_model=Token)
+async def refresh_token(refresh_token_data: str = Depends(oauth2_scheme),
+                        session: AsyncSession = Depends(get_async_session)):
+    """
+    This method is used to refresh the access token of a user. It takes the refresh token as input, verifies it,
+    and returns a new access token. The given refresh token is revoked and replaced by a new one (rotation).
+
+    Returns:
+        A dictionary containing the new access token, token type, and refresh token if the refresh token is valid.
+
+    Raises:
+        HTTPException (401): If the refresh token is missing 'sub', 'jti' or 'exp' in payload, if the token is expired
+        or already used, or if there is a JWTError while decoding the token.
+    """
+
+    payload = await revoke_refresh_token(refresh_token_data, session)
+
+    # All claims of the refresh token (except expiration time, ID and type) are carried over to the new tokens.
+    claims = {key: value for key, value in payload.items() if key not in ["exp", "jti", "token_type"]}
+
+    return await issue_tokens(claims, session)
+
+
+@router.post("/logout", response_model=None)
+async def logout(refresh_token_data: str = Depends(oauth2_scheme),
+                 session: AsyncSession = Depends(get_async_session)) -> dict:
+    """
+    This method is used to revoke the given refresh token, so it can't be used to get new tokens.
+
+    Returns:
+        A dictionary containing a message (dict).
+
+    Raises:
+        HTTPException (401): If the refresh token is invalid, expired or already revoked.
+    """
+
+    await revoke_refresh_token(refresh_token_data, session)
 
+    return {"message": "Refresh token has been revoked."}
@@ -0,0 +1,106 @@
+import asyncio
+import hashlib
+import math
+import time
+from datetime import datetime
+
+from app.api.v1.repositories.refresh_token_repository import RefreshTokenRepository
+from app.api.v1.services.metrics.metrics_service import metrics
+from app.config.database import async_session_maker
+from app.config.env_config import REVOKED_TOKENS_BLOOM_CAPACITY, REFRESH_TOKENS_PURGE_INTERVAL_SECONDS
+
+
+class BloomFilter:
+    """
+    This class is used to test if an item may be in a set, using a fixed amount of memory. It never gives
+    false negatives, and gives false positives with about 'error_rate' probability while it holds up to
+    'capacity' items.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01) -> None:
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str) -> list[int]:
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little")
+
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevokedTokens:
+    """
+    This class is used to keep JTIs of revoked refresh tokens in memory. Most lookups of not revoked tokens are
+    answered by the Bloom filter alone, and its positives are confirmed by the exact set.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self._expires_at: dict[str, float] = {}
+        self._bloom_filter = BloomFilter(capacity)
+
+        metrics.register_gauge("auth.revoked_tokens.size", lambda: len(self._expires_at))
+
+    def add(self, jti: str, expires_at: datetime) -> None:
+        self._expires_at[jti] = expires_at.timestamp()
+        self._bloom_filter.add(jti)
+
+    def __contains__(self, jti: str) -> bool:
+        if jti not in self._bloom_filter:
+            return False
+
+        return jti in self._expires_at
+
+    def purge(self) -> None:
+        """
+        This method is used to forget expired tokens and to rebuild the Bloom filter from the remaining ones.
+        """
+
+        now = time.time()
+        self._expires_at = {jti: expires_at for jti, expires_at in self._expires_at.items() if expires_at > now}
+
+        self._bloom_filter = BloomFilter(max(self.capacity, len(self._expires_at)))
+        for jti in self._expires_at:
+            self._bloom_filter.add(jti)
+
+
+revoked_tokens = RevokedTokens(REVOKED_TOKENS_BLOOM_CAPACITY)
+
+
+async def load_revoked_tokens() -> None:
+    """
+    This method is used to fill the in-memory revocation structure with revoked, not yet expired tokens from the DB.
+    """
+
+    async with async_session_maker() as session:
+        for jti, expires_at in await RefreshTokenRepository(session).get_revoked_refresh_tokens():
+            revoked_tokens.add(jti, expires_at)
+
+
+async def purge_expired_refresh_tokens() -> None:
+    """
+    This method is used to periodically delete expired refresh tokens from the DB and from memory.
+    """
+
+    while True:
+        await asyncio.sleep(REFRESH_TOKENS_PURGE_INTERVAL_SECONDS)
+
+        try:
+            async with async_session_maker() as session:
+                deleted = await RefreshTokenRepository(session).delete_expired_refresh_tokens()
+                await session.commit()
+        except Exception:
+            # The DB may be temporarily unavailable, expired tokens will be deleted on the next run.
+            metrics.increment("auth.refresh_tokens.purge_failed")
+            deleted = 0
+        revoked_tokens.purge()
+
+        metrics.increment("auth.refresh_tokens.purged", deleted)
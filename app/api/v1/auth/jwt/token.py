@@ -22,7 +22,8 @@ def create_token(*, data: dict, token_type: str, expires_delta: timedelta = None
         else:
             expire = datetime.now() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
 
-    to_encode.update({"exp": expire.timestamp()})
+    # The type is checked on use, so a refresh token can't be used as an access token and vice versa.
+    to_encode.update({"exp": expire.timestamp(), "token_type": token_type})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -9,3 +9,11 @@ class Token(BaseModel):
 
 class RefreshTokenRequest(BaseModel):
     refresh_token: str
+
+
+class Principal(BaseModel):
+    user_role: str
+    subject: str
+    user_id: int | None = None
+    # ID of the patient's doctor ('Patient' role only).
+    doctor_id: int | None = None
@@ -0,0 +1,119 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable
+
+from passlib.context import CryptContext
+
+from app.api.v1.services.metrics.metrics_service import metrics
+from app.config.env_config import PASSWORD_EXECUTOR_KIND, PASSWORD_EXECUTOR_WORKERS, BCRYPT_ROUNDS
+
+# The only password context of the application. Hashes with a cost other than BCRYPT_ROUNDS are reported
+# by 'needs_update', so they can be rehashed.
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__default_rounds=BCRYPT_ROUNDS,
+                           bcrypt__min_rounds=BCRYPT_ROUNDS, bcrypt__max_rounds=BCRYPT_ROUNDS)
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+class PasswordExecutor:
+    """
+    This class is used to run CPU-bound password work (bcrypt hashing and verification) outside the event loop,
+    in a dedicated pool of threads or processes with a fixed size.
+    """
+
+    def __init__(self, kind: str = "thread", max_workers: int = 4) -> None:
+        if kind not in ["thread", "process"]:
+            raise ValueError(f"Unknown password executor kind: {kind}.")
+
+        self.kind = kind
+        self.max_workers = max_workers
+        self.in_flight = 0
+        self._executor: Executor | None = None
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        Number of submitted tasks that are waiting for a free worker.
+        """
+
+        return max(0, self.in_flight - self.max_workers)
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="password")
+
+        return self._executor
+
+    async def run(self, operation: str, function: Callable[..., Any], *args: Any) -> Any:
+        """
+        This method is used to run the given function in the executor and to record its latency
+        (including time spent in the queue) under the 'password.<operation>' timing.
+
+        Returns:
+            result of the function (Any)
+        """
+
+        loop = asyncio.get_running_loop()
+        started_at = time.perf_counter()
+        self.in_flight += 1
+        try:
+            return await loop.run_in_executor(self._get_executor(), function, *args)
+        finally:
+            self.in_flight -= 1
+            metrics.observe(f"password.{operation}", time.perf_counter() - started_at)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_executor = PasswordExecutor(PASSWORD_EXECUTOR_KIND, PASSWORD_EXECUTOR_WORKERS)
+
+metrics.register_gauge("password.in_flight", lambda: password_executor.in_flight)
+metrics.register_gauge("password.queue_depth", lambda: password_executor.queue_depth)
+
+
+async def hash_password(password: str) -> str:
+    """
+    This method is used to hash the raw password in the password executor.
+
+    Returns:
+        hashed password (str)
+    """
+
+    return await password_executor.run("hash", _hash, password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """
+    This method is used to verify the identity of the raw and encrypted password in the DB.
+    The check is done in the password executor, so it doesn't block the event loop.
+
+    Returns:
+        True or False (bool)
+    """
+
+    return await password_executor.run("verify", _verify, plain_password, hashed_password)
+
+
+def password_needs_update(hashed_password: str) -> bool:
+    """
+    This method is used to check if the hash was made with outdated settings (for example, another bcrypt cost)
+    and should be replaced. The check only parses the hash, so it's cheap.
+
+    Returns:
+        True or False (bool)
+    """
+
+    return pwd_context.needs_update(hashed_password)
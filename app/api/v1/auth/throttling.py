@@ -0,0 +1,130 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Hashable, Tuple
+
+from fastapi import HTTPException
+
+from app.api.v1.services.metrics.metrics_service import metrics
+from app.config.env_config import LOGIN_MAX_CONCURRENCY, LOGIN_MAX_QUEUE, LOGIN_QUEUE_TIMEOUT_SECONDS, \
+    LOGIN_USERNAME_RATE_PER_MINUTE, LOGIN_USERNAME_BURST, LOGIN_CLIENT_RATE_PER_MINUTE, LOGIN_CLIENT_BURST, \
+    LOGIN_THROTTLE_MAX_KEYS
+
+
+class TokenBucketThrottle:
+    """
+    This class is used to limit the rate of actions per key (for example, per username or client address).
+    Every key has a bucket of 'burst' tokens, refilled with 'rate_per_minute' tokens per minute, and every
+    action takes one token. Only the 'max_keys' most recently used buckets are kept in memory.
+    """
+
+    def __init__(self, name: str, rate_per_minute: float, burst: int, max_keys: int) -> None:
+        self.name = name
+        self.rate_per_second = rate_per_minute / 60
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[Hashable, Tuple[float, float]] = OrderedDict()
+
+    def acquire(self, key: Hashable) -> float:
+        """
+        This method is used to take one token from the bucket of the given key.
+
+        Returns:
+            0 if the action is allowed, otherwise the number of seconds until the next token (float)
+        """
+
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated_at) * self.rate_per_second)
+
+        if tokens >= 1:
+            tokens -= 1
+            retry_after = 0.0
+        elif self.rate_per_second > 0:
+            retry_after = (1 - tokens) / self.rate_per_second
+        else:
+            retry_after = math.inf
+
+        self._buckets[key] = (tokens, now)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+        if retry_after:
+            metrics.increment(f"{self.name}.rejected")
+
+        return retry_after
+
+    def check(self, key: Hashable) -> None:
+        """
+        This method is used to take one token from the bucket of the given key.
+
+        Raises:
+            HTTPException (429): If the bucket is empty.
+        """
+
+        retry_after = self.acquire(key)
+        if retry_after:
+            headers = {"Retry-After": str(math.ceil(retry_after))} if retry_after != math.inf else None
+            raise HTTPException(status_code=429, detail="Too many login attempts. Try again later.", headers=headers)
+
+
+class AdmissionGate:
+    """
+    This class is used to bound the number of concurrently running expensive operations. Requests above
+    'max_concurrency' wait in a queue of at most 'max_queue' requests for up to 'timeout' seconds.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, timeout: float) -> None:
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.running = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        metrics.register_gauge(f"{name}.running", lambda: self.running)
+        metrics.register_gauge(f"{name}.waiting", lambda: self.waiting)
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        """
+        This method is used to run the wrapped block when a slot is free.
+
+        Raises:
+            HTTPException (503): If the queue is full or the slot wasn't acquired in time.
+        """
+
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            metrics.increment(f"{self.name}.rejected")
+            raise HTTPException(status_code=503, detail="Server is busy. Try again later.",
+                                headers={"Retry-After": str(math.ceil(self.timeout))})
+
+        started_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            metrics.increment(f"{self.name}.timed_out")
+            raise HTTPException(status_code=503, detail="Server is busy. Try again later.",
+                                headers={"Retry-After": str(math.ceil(self.timeout))})
+        finally:
+            self.waiting -= 1
+            metrics.observe(f"{self.name}.wait", time.perf_counter() - started_at)
+
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self._semaphore.release()
+
+
+login_gate = AdmissionGate("auth.login_gate", LOGIN_MAX_CONCURRENCY, LOGIN_MAX_QUEUE, LOGIN_QUEUE_TIMEOUT_SECONDS)
+
+username_throttle = TokenBucketThrottle("auth.username_throttle", LOGIN_USERNAME_RATE_PER_MINUTE,
+                                        LOGIN_USERNAME_BURST, LOGIN_THROTTLE_MAX_KEYS)
+client_throttle = TokenBucketThrottle("auth.client_throttle", LOGIN_CLIENT_RATE_PER_MINUTE,
+                                      LOGIN_CLIENT_BURST, LOGIN_THROTTLE_MAX_KEYS)
@@ -5,6 +5,7 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
+from app.api.v1.repositories.writes import update_returning
 from app.models.models import Admin
 from app.schemas.schemas import AdminRead, AdminCreateHashedPassword, AdminUpdateHashedPassword
 
@@ -63,7 +64,6 @@ class AdminRepository:
         new_admin = Admin(**new_admin_data.model_dump())
         self.session.add(new_admin)
         await self.session.flush()
-        await self.session.commit()
 
         return new_admin
 
@@ -88,10 +88,25 @@ class AdminRepository:
             setattr(admin_to_update, key, value)
 
         await self.session.flush()
-        await self.session.commit()
 
         return admin_to_update
 
+    async def patch_admin(self, admin_id: int, values: dict[str, Any]) -> dict[str, Any] | None:
+        """
+        This method is used to update only the given columns of the admin by a single 'UPDATE ... RETURNING'
+        statement, without loading the admin first.
+
+        Returns:
+            updated admin, or None if it doesn't exist (dict[str, Any] | None)
+        """
+
+        admin = await update_returning(self.session, Admin, admin_id, values,
+                                       [getattr(Admin, column) for column in AdminRead.model_fields])
+        if admin is None:
+            return None
+
+        return dict(admin._mapping)
+
     async def delete_admin(self, admin_id: int) -> int:
         """
         This method is used to delete the existing admin with given ID.
@@ -105,6 +120,6 @@ class AdminRepository:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
         await self.session.delete(admin_to_delete)
-        await self.session.commit()
+        await self.session.flush()
 
         return admin_id
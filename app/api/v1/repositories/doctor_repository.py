@@ -1,19 +1,52 @@
 from typing import Sequence, Any, Tuple
 
 from fastapi import HTTPException
-from jose import JWTError
-from sqlalchemy import select, Row, RowMapping, or_, func, text
+from sqlalchemy import select, Row, RowMapping
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.v1.auth.auth import verify_token
+from app.api.v1.repositories.pagination import fetch_page, SortKey, total_counts, slice_ranking
+from app.api.v1.repositories.writes import insert_returning, update_returning, delete_returning
+from app.api.v1.repositories.search import search_condition, search_similarity, rank_search_results, search_words, \
+    doctor_search_results
+from app.api.v1.services.autocomplete.autocomplete_service import doctor_autocomplete, to_entry
+from app.api.v1.services.pagination.pagination_service import Pagination
+from app.config.database import after_commit
 from app.models.models import Doctor, Patient
-from app.schemas.schemas import DoctorRead, DoctorCreateHashedPassword, DoctorUpdateHashedPassword, PatientRead
+from app.schemas.schemas import DoctorRead, DoctorCreateHashedPassword, DoctorUpdateHashedPassword
 
 
 class DoctorRepository:
     def __init__(self, session: AsyncSession) -> None:
         self.session = session
 
+    def _on_change(self, doctor: Doctor) -> None:
+        """
+        This method is used to update data derived from the doctors table once the transaction, in which
+        the given doctor was created or updated (its new state), is committed.
+        """
+
+        entry = to_entry(doctor)
+
+        def update_derived_data() -> None:
+            total_counts.invalidate()
+            doctor_search_results.invalidate()
+            doctor_autocomplete.put(entry)
+
+        after_commit(self.session, update_derived_data)
+
+    def _on_delete(self, doctor_ids: Sequence[int]) -> None:
+        """
+        This method is used to update data derived from the doctors table once the transaction, in which
+        the doctors with given IDs were deleted, is committed.
+        """
+
+        def update_derived_data() -> None:
+            total_counts.invalidate()
+            doctor_search_results.invalidate()
+            doctor_autocomplete.remove_many(doctor_ids)
+
+        after_commit(self.session, update_derived_data)
+
     async def get_doctors_without_pagination(self) -> Sequence[DoctorRead]:
         """
         This method is used to retrieve all doctors from the DB without.
@@ -27,7 +60,7 @@ class DoctorRepository:
 
         return doctors
 
-    async def get_doctors(self, offset: int = 0, limit: int = 10) -> Tuple[int, Sequence[DoctorRead]]:
+    async def get_doctors(self, pagination: Pagination) -> Tuple[int, Sequence[DoctorRead]]:
         """
         This method is used to retrieve all doctors from the DB.
 
@@ -36,12 +69,8 @@ class DoctorRepository:
             doctors (Sequence[DoctorRead])
         """
 
-        total = await self.session.execute(func.count(Doctor.id))
-        total = total.scalar()
-        data = await self.session.execute(select(Doctor).offset(offset).limit(limit))
-        doctors = data.scalars().all()
-
-        return total, doctors
+        return await fetch_page(self.session, select(Doctor), pagination, [SortKey(Doctor.id)],
+                                total_cache_key=("doctors",))
 
     async def get_doctor_by_id(self, doctor_id: int) -> DoctorRead | None:
         """
@@ -69,81 +98,105 @@ class DoctorRepository:
 
         return doctor
 
-    async def get_doctor_patients(self, doctor_id: int, offset: int = 0, limit: int = 10) -> \
-            Tuple[int, Sequence[PatientRead]]:
+    async def get_doctor_id_by_IIN(self, doctor_IIN: str) -> int | None:
+        """
+        This method is used to retrieve only the 'id' of a certain doctor from the DB by 'IIN' field.
+
+        Returns:
+            doctor ID (int | None)
+        """
+
+        data = await self.session.execute(select(Doctor.id).where(Doctor.IIN == doctor_IIN))
+        doctor_id = data.scalar()
+
+        return doctor_id
+
+    async def get_doctor_patients(self, doctor_id: int, pagination: Pagination, columns: Sequence[str]) -> \
+            Tuple[int, Sequence[dict[str, Any]]]:
         """
         Retrieve list of doctor's patients, assigned to the doctor with this ID.
 
         Arguments:
             doctor_id (int): doctor ID
+            columns (Sequence[str]): patient columns to select
 
         Returns:
             total (int)
-            Sequence[PatientRead]: List of patients, assigned to the doctor
+            Sequence[dict[str, Any]]: List of patients, assigned to the doctor
         """
 
-        total = await self.session.execute(select(func.count(Patient.id)).where(Patient.doctor_id == doctor_id))
-        total = total.scalar()
-        query = select(Patient).where(Patient.doctor_id == doctor_id).offset(offset).limit(limit)
-        data = await self.session.execute(query)
-        doctor_patients = data.scalars().all()
+        query = select(*(getattr(Patient, column) for column in columns)).where(Patient.doctor_id == doctor_id)
+
+        return await fetch_page(self.session, query, pagination, [SortKey(Patient.id)],
+                                total_cache_key=("doctor.patients", doctor_id))
 
-        return total, doctor_patients
+    async def get_doctors_by_ids(self, doctor_ids: Sequence[int]) -> list[Doctor]:
+        """
+        This method is used to retrieve doctors with given IDs, in the order of the IDs.
 
-    async def search_doctors(self, search_query: str, token: str, offset: int = 0, limit: int = 10) -> Sequence[Row[Any] | RowMapping | Any]:
+        Returns:
+            doctors (list[Doctor])
+        """
+
+        if not doctor_ids:
+            return []
+
+        data = await self.session.execute(select(Doctor).where(Doctor.id.in_(doctor_ids)))
+        doctors = {doctor.id: doctor for doctor in data.scalars().all()}
+
+        return [doctors[doctor_id] for doctor_id in doctor_ids if doctor_id in doctors]
+
+    async def search_doctors(self, search_query: str, pagination: Pagination,
+                             scope: str = "") -> Sequence[Row[Any] | RowMapping | Any]:
         """
         This method is used to search and retrieve doctors from the DB
         by a search query (any combination of: (first_name, last_name, middle_name) or IIN).
+        The ranking of results is cached by the scope and the query,
+        so following pages and repeated searches only fetch rows of the page by IDs.
 
         Returns:
             doctors (Sequence[Row[Any] | RowMapping | Any])
         """
 
-        try:
-            user_role = verify_token(token)
-            if user_role["user_role"] in ["Patient"]:
-                raise HTTPException(status_code=403, detail="Forbidden: Unauthorized role")
-        except JWTError:
-            raise HTTPException(status_code=401, detail="Invalid token")
-
-        words = search_query.lower().split()
-        conditions = [func.lower(Doctor.IIN).like(f"%{word}%") for word in words]
-        conditions.extend([func.lower(Doctor.first_name).like(f"%{word}%") for word in words])
-        conditions.extend([func.lower(Doctor.last_name).like(f"%{word}%") for word in words])
-        conditions.extend([func.lower(Doctor.middle_name).like(f"%{word}%") for word in words])
-
-        query = select(Doctor, func.similarity(func.concat_ws(' ', Doctor.first_name,
-                                                               Doctor.last_name, Doctor.middle_name),
-                                                text(':search_query')).label('similarity')). \
-            where(or_(*conditions)). \
-            order_by(text('similarity DESC')). \
-            offset(offset).limit(limit)
+        words = search_words(search_query)
+        if not words:
+            raise HTTPException(status_code=404, detail="Doctors not found")
 
-        result = await self.session.execute(query, {'search_query': ' '.join(words)})
-        doctors = result.scalars().all()
+        similarity = search_similarity(Doctor, words)
+        sort_keys = [SortKey(similarity, descending=True), SortKey(Doctor.id)]
 
-        total = await self.session.execute(select(func.count()).where(or_(*conditions)))
-        total = total.scalar()
+        ranking = await rank_search_results(self.session, Doctor, words, doctor_search_results, scope)
+        if ranking is not None:
+            pagination.total_strategy = "cached"
+            page = slice_ranking(ranking, pagination, sort_keys)
+            total, doctors = len(ranking), await self.get_doctors_by_ids([key[-1] for key in page])
+        else:
+            query = select(Doctor).where(search_condition(Doctor, words))
+            total, doctors = await fetch_page(self.session, query, pagination, sort_keys,
+                                              total_cache_key=("doctors.search", tuple(words)))
 
         if not doctors:
             raise HTTPException(status_code=404, detail="Doctors not found")
 
         return total, doctors
 
-    async def create_doctor(self, new_doctor_data: DoctorCreateHashedPassword) -> dict[str, Any]:
+    async def create_doctor(self, new_doctor_data: DoctorCreateHashedPassword) -> dict[str, Any] | None:
         """
-        This method is used to create a doctor with the given data ('DoctorCreateHashedPassword' model).
+        This method is used to create a doctor with the given data ('DoctorCreateHashedPassword' model)
+        by a single 'INSERT ... ON CONFLICT DO NOTHING RETURNING' statement.
 
         Returns:
-            created doctor (dict[str, Any])
+            created doctor, or None if a doctor with the same IIN already exists (dict[str, Any] | None)
         """
 
-        new_doctor = Doctor(**new_doctor_data.model_dump())
-        self.session.add(new_doctor)
-        await self.session.flush()
-        await self.session.commit()
+        new_doctor = await insert_returning(self.session, Doctor, new_doctor_data.model_dump(),
+                                            [getattr(Doctor, column) for column in DoctorRead.model_fields])
+        if new_doctor is None:
+            return None
+
+        self._on_change(new_doctor)
 
-        return new_doctor
+        return dict(new_doctor._mapping)
 
     async def update_doctor(self, new_data_for_doctor: DoctorUpdateHashedPassword, doctor_id: int) -> DoctorRead:
         """
@@ -162,24 +215,56 @@ class DoctorRepository:
             setattr(doctor_to_update, key, value)
 
         await self.session.flush()
-        await self.session.commit()
+        self._on_change(doctor_to_update)
 
         return doctor_to_update
 
-    async def delete_doctor(self, doctor_id: int) -> int:
+    async def patch_doctor(self, doctor_id: int, values: dict[str, Any]) -> dict[str, Any] | None:
         """
-        This method is used to delete the existing doctor with given ID.
+        This method is used to update only the given columns of the doctor by a single 'UPDATE ... RETURNING'
+        statement, without loading the doctor first.
 
         Returns:
-            deleted doctor ID (int)
+            updated doctor, or None if it doesn't exist (dict[str, Any] | None)
+        """
+
+        doctor = await update_returning(self.session, Doctor, doctor_id, values,
+                                        [getattr(Doctor, column) for column in DoctorRead.model_fields])
+        if doctor is None:
+            return None
+
+        self._on_change(doctor)
+
+        return dict(doctor._mapping)
+
+    async def delete_doctors(self, doctor_ids: Sequence[int]) -> list[int]:
+        """
+        This method is used to delete the existing doctors with given IDs by a single statement.
+
+        Returns:
+            IDs of the deleted doctors (list[int])
 
         Raises:
-            HTTPException: If the doctor with the given ID is not found.
+            IntegrityError: If any of the doctors has patients (nothing is deleted then).
         """
 
-        doctor_to_delete = await self.get_doctor_by_id(doctor_id)
+        deleted_ids = await delete_returning(self.session, Doctor, doctor_ids)
+        if deleted_ids:
+            self._on_delete(deleted_ids)
 
-        await self.session.delete(doctor_to_delete)
-        await self.session.commit()
+        return deleted_ids
 
-        return doctor_id
+    async def delete_doctor(self, doctor_id: int) -> int | None:
+        """
+        This method is used to delete the existing doctor with given ID.
+
+        Returns:
+            deleted doctor ID, or None if it doesn't exist (int | None)
+
+        Raises:
+            IntegrityError: If the doctor has patients.
+        """
+
+        deleted_ids = await self.delete_doctors([doctor_id])
+
+        return deleted_ids[0] if deleted_ids else None
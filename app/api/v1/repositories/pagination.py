@@ -0,0 +1,284 @@
+import bisect
+import json
+import time
+from typing import Any, Hashable, NamedTuple, Sequence, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import Select, ScalarSelect, ColumnElement, Executable, Table, Integer, BigInteger, func, and_, or_, \
+    select, table, column, cast
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql import ClauseElement
+
+from app.api.v1.services.cache.cache_service import TTLCache
+from app.api.v1.services.pagination.pagination_service import Pagination
+from app.config.database import read_lag_seconds
+from app.config.env_config import TOTAL_COUNT_CACHE_SIZE, TOTAL_COUNT_CACHE_TTL_SECONDS
+
+# Exact totals of lists with the 'cached' strategy. Repositories clear it on every write.
+total_counts = TTLCache("pagination.total_counts", TOTAL_COUNT_CACHE_SIZE, ttl=TOTAL_COUNT_CACHE_TTL_SECONDS)
+
+pg_class = table("pg_class", column("oid"), column("reltuples"))
+
+
+class SortKey(NamedTuple):
+    expression: ColumnElement
+    descending: bool = False
+
+
+def count_total(query: Select) -> ScalarSelect:
+    """
+    This method is used to build the total number of rows matching the query. The total is an uncorrelated scalar
+    subquery with the same FROM and WHERE clauses, so the DB computes it once (as an InitPlan), while the page itself
+    is still read with 'LIMIT'. Unlike 'count(*) OVER ()' it doesn't make the DB build every matching row before
+    the page is cut.
+
+    Returns:
+        total (ScalarSelect)
+    """
+
+    return query.with_only_columns(func.count(), maintain_column_froms=True).order_by(None).scalar_subquery()
+
+
+class Explain(Executable, ClauseElement):
+    """
+    This class is used to get the plan of the statement ('EXPLAIN (FORMAT JSON) ...') with the statement's parameters.
+    """
+
+    inherit_cache = False
+
+    def __init__(self, statement: Select) -> None:
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def compile_explain(element: Explain, compiler, **kwargs) -> str:
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kwargs)
+
+
+def estimate_table_total(query: Select) -> ScalarSelect | None:
+    """
+    This method is used to build the number of rows of the table from the planner statistics ('pg_class.reltuples').
+    It's possible only for queries reading a whole table without conditions.
+
+    Returns:
+        estimated total, or None if the query has conditions (ScalarSelect | None)
+    """
+
+    froms = query.get_final_froms()
+    if query.whereclause is not None or len(froms) != 1 or not isinstance(froms[0], Table):
+        return None
+
+    # 'reltuples' is -1 for tables, which were never analyzed.
+    return select(cast(func.greatest(pg_class.c.reltuples, 0), BigInteger)). \
+        where(pg_class.c.oid == func.to_regclass(froms[0].name)). \
+        scalar_subquery()
+
+
+async def estimate_total(session: AsyncSession, query: Select) -> int:
+    """
+    This method is used to get the number of rows matching the query, estimated by the planner.
+
+    Returns:
+        estimated total (int)
+    """
+
+    data = await session.execute(Explain(query))
+    plan = data.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def check_cursor_key(pagination: Pagination, sort_keys: Sequence[SortKey]) -> None:
+    """
+    This method is used to check that the sort key of the cursor fits the sort keys of the list: the number of values
+    matches, and integer sort keys (e.g. 'id') get integers within the range of the column.
+
+    Raises:
+        HTTPException (400): If the cursor was issued for another list, or was tampered with.
+    """
+
+    if len(pagination.cursor_key) != len(sort_keys):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+    for value, sort_key in zip(pagination.cursor_key, sort_keys):
+        if isinstance(sort_key.expression.type, Integer):
+            bits = 64 if isinstance(sort_key.expression.type, BigInteger) else 32
+            if not isinstance(value, int) or not -2 ** (bits - 1) <= value < 2 ** (bits - 1):
+                raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+def keyset_condition(sort_keys: Sequence[SortKey], values: Sequence[Any], forward: bool) -> ColumnElement:
+    """
+    This method is used to build the condition selecting rows after (or before) the given sort key, e.g. for keys
+    (a DESC, id) going forward: a < :a OR (a = :a AND id > :id).
+
+    Returns:
+        condition (ColumnElement)
+    """
+
+    conditions = []
+    for index, sort_key in enumerate(sort_keys):
+        if forward != sort_key.descending:
+            comparison = sort_key.expression > values[index]
+        else:
+            comparison = sort_key.expression < values[index]
+
+        equalities = [previous.expression == values[i] for i, previous in enumerate(sort_keys[:index])]
+        conditions.append(and_(*equalities, comparison))
+
+    return or_(*conditions)
+
+
+def slice_ranking(ranking: Sequence[Sequence[Any]], pagination: Pagination, sort_keys: Sequence[SortKey]) -> \
+        Sequence[Sequence[Any]]:
+    """
+    This method is used to take a page from the ranking (sort keys of all matching rows in order, e.g. cached
+    search results), with the same offset and cursor semantics as 'fetch_page'. Sort keys must be numeric.
+
+    Returns:
+        sort keys of the rows of the page (Sequence[Sequence[Any]])
+    """
+
+    def position_key(key: Sequence[Any]) -> tuple:
+        return tuple(-value if sort_key.descending else value for value, sort_key in zip(key, sort_keys))
+
+    size = pagination.page_size
+    if pagination.cursor_key is None or pagination.cursor_direction == "next":
+        if pagination.cursor_key is None:
+            start = pagination.offset
+        else:
+            check_cursor_key(pagination, sort_keys)
+            positions = [position_key(key) for key in ranking]
+            start = bisect.bisect_right(positions, position_key(pagination.cursor_key))
+
+        page = ranking[start:start + size]
+        has_more = start + size < len(ranking)
+    else:
+        check_cursor_key(pagination, sort_keys)
+        positions = [position_key(key) for key in ranking]
+        end = bisect.bisect_left(positions, position_key(pagination.cursor_key))
+        start = max(0, end - size)
+
+        page = ranking[start:end]
+        has_more = start > 0
+
+    if page:
+        pagination.set_page_keys(tuple(page[0]), tuple(page[-1]), has_more)
+    else:
+        pagination.set_page_keys(None, None, False)
+
+    return page
+
+
+async def fetch_page(session: AsyncSession, query: Select, pagination: Pagination, sort_keys: Sequence[SortKey],
+                     total_cache_key: Hashable | None = None) -> Tuple[int, Sequence[Any]]:
+    """
+    This method is used to retrieve a page of the query result together with the total number of matching rows.
+    Rows are ordered by 'sort_keys' (the last one must be unique, e.g. 'id'). In cursor mode the page is selected
+    by the keyset condition instead of 'OFFSET'. One extra row is read to find out if there are more pages, and
+    sort keys of the page are passed to the pagination to build cursors.
+
+    The total is computed with the strategy of the pagination:
+    - 'exact': counted in the page query (a single round trip);
+    - 'estimate': taken from 'pg_class' in the page query for whole tables, or from 'EXPLAIN' of the query;
+    - 'cached': taken from 'total_counts' by 'total_cache_key', or counted in the page query and cached (unless it
+      was read from the replica, which may not have replayed the write, which invalidated the cache, yet).
+
+    When the page is empty, the total isn't returned by the DB, and 0 is returned ('Pagination.paginate' reports
+    empty pages with 0 total anyway).
+
+    Returns:
+        total (int)
+        the entity of every row for entity queries, or selected columns of every row as dicts (Sequence[Any])
+
+    Raises:
+        HTTPException (400): If the cursor was issued for a list with other sort keys.
+    """
+
+    descriptions = query.column_descriptions
+    entity_query = len(descriptions) == 1 and descriptions[0]["expr"] is descriptions[0]["entity"]
+    column_count = len(descriptions)
+
+    total = None
+    if pagination.total_strategy == "cached":
+        total = total_counts.get(total_cache_key)
+
+    total_column = None
+    if total is None:
+        if pagination.total_strategy == "estimate":
+            total_column = estimate_table_total(query)
+            if total_column is None:
+                total = await estimate_total(session, query)
+        else:
+            total_column = count_total(query)
+
+    forward = pagination.cursor_direction == "next"
+    page_query = query
+    if pagination.cursor_key is not None:
+        check_cursor_key(pagination, sort_keys)
+        page_query = page_query.where(keyset_condition(sort_keys, pagination.cursor_key, forward))
+
+    # Sort keys, which aren't selected by the query (e.g. the search similarity), are added to the page.
+    sort_key_names = []
+    for index, sort_key in enumerate(sort_keys):
+        selected = [selected_column for selected_column in query.selected_columns
+                    if selected_column.compare(sort_key.expression.expression)]
+        if selected:
+            sort_key_names.append(selected[0].key)
+        else:
+            sort_key_names.append(f"sort_key_{index}")
+            page_query = page_query.add_columns(sort_key.expression.label(sort_key_names[-1]))
+
+    order = [sort_key.expression.desc() if sort_key.descending == forward else sort_key.expression.asc()
+             for sort_key in sort_keys]
+    page = page_query.order_by(*order).offset(pagination.offset).limit(pagination.page_size + 1).subquery("page")
+
+    # The total and the sort keys are added outside of the page. Any column added to the page query itself would
+    # make the DB build a new row for every row skipped by 'OFFSET' (more than doubling the time of deep pages).
+    if entity_query:
+        selected_columns = [aliased(descriptions[0]["entity"], page)]
+    else:
+        selected_columns = list(page.c)[:column_count]
+    page_sort_keys = [page.c[name] for name in sort_key_names]
+
+    query = select(*selected_columns)
+    if total_column is not None:
+        query = query.add_columns(total_column.label("total"))
+    query = query.add_columns(*page_sort_keys).order_by(
+        *(column.desc() if sort_key.descending == forward else column.asc()
+          for column, sort_key in zip(page_sort_keys, sort_keys))
+    )
+
+    read_at = time.time() - read_lag_seconds(session)
+    data = await session.execute(query)
+    rows = data.all()
+
+    has_more = len(rows) > pagination.page_size
+    rows = rows[:pagination.page_size]
+    if not forward:
+        rows.reverse()
+
+    if not rows:
+        pagination.set_page_keys(None, None, False)
+        return 0, []
+
+    keys = [tuple(row[-len(sort_keys):]) for row in (rows[0], rows[-1])]
+    pagination.set_page_keys(keys[0], keys[1], has_more)
+
+    if total is None:
+        total = rows[0].total
+        if pagination.total_strategy == "cached":
+            total_counts.set_if_not_invalidated_since(total_cache_key, total, read_at)
+
+    if pagination.total_strategy == "estimate":
+        # Statistics may be outdated, but there are at least as many rows as have already been read.
+        total = max(total, pagination.offset + len(rows))
+
+    if entity_query:
+        return total, [row[0] for row in rows]
+
+    return total, [dict(zip(row._fields[:column_count], row[:column_count])) for row in rows]
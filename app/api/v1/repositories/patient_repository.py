@@ -1,11 +1,16 @@
 from typing import Sequence, Any
 
 from fastapi import HTTPException
-from jose import JWTError
-from sqlalchemy import select, Row, RowMapping, or_, func, text
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.v1.auth.auth import verify_token
+from app.api.v1.repositories.pagination import fetch_page, SortKey, total_counts, slice_ranking
+from app.api.v1.repositories.writes import insert_returning, update_returning, delete_returning, NAME_COLUMNS
+from app.api.v1.repositories.search import search_condition, search_similarity, rank_search_results, search_words, \
+    patient_search_results
+from app.api.v1.services.autocomplete.autocomplete_service import patient_autocomplete, to_entry
+from app.api.v1.services.pagination.pagination_service import Pagination
+from app.config.database import after_commit
 from app.models.models import Patient
 from app.schemas.schemas import PatientRead, PatientCreateHashedPassword, PatientUpdateHashedPassword
 
@@ -14,21 +19,48 @@ class PatientRepository:
     def __init__(self, session: AsyncSession) -> None:
         self.session = session
 
-    async def get_patients(self, offset: int = 0, limit: int = 10) -> tuple[Any | None, Sequence[Patient]]:
+    def _on_change(self, patient: Patient) -> None:
+        """
+        This method is used to update data derived from the patients table once the transaction, in which
+        the given patient was created or updated (its new state), is committed.
+        """
+
+        entry = to_entry(patient)
+
+        def update_derived_data() -> None:
+            total_counts.invalidate()
+            patient_search_results.invalidate()
+            patient_autocomplete.put(entry)
+
+        after_commit(self.session, update_derived_data)
+
+    def _on_delete(self, patient_ids: Sequence[int]) -> None:
+        """
+        This method is used to update data derived from the patients table once the transaction, in which
+        the patients with given IDs were deleted, is committed.
         """
-        This method is used to retrieve all patients from the DB.
+
+        def update_derived_data() -> None:
+            total_counts.invalidate()
+            patient_search_results.invalidate()
+            patient_autocomplete.remove_many(patient_ids)
+
+        after_commit(self.session, update_derived_data)
+
+    async def get_patients(self, pagination: Pagination, columns: Sequence[str]) -> \
+            tuple[Any | None, Sequence[dict[str, Any]]]:
+        """
+        This method is used to retrieve all patients from the DB. Only the given columns are selected.
 
         Returns:
             total (int)
-            patients (tuple[Any | None, Sequence[Patient]])
+            patients (Sequence[dict[str, Any]])
         """
 
-        total = await self.session.execute(func.count(Patient.id))
-        total = total.scalar()
-        data = await self.session.execute(select(Patient).offset(offset).limit(limit))
-        patients = data.scalars().all()
+        query = select(*(getattr(Patient, column) for column in columns))
 
-        return total, patients
+        return await fetch_page(self.session, query, pagination, [SortKey(Patient.id)],
+                                total_cache_key=("patients",))
 
     async def get_patient_by_id(self, patient_id: int) -> PatientRead | None:
         """
@@ -56,62 +88,91 @@ class PatientRepository:
 
         return patient
 
-    async def search_patients(self, search_query: str, token: str, offset: int = 0, limit: int = 10) -> tuple[
-        int, Sequence[Row[Any] | RowMapping | Any]]:
+    async def get_patient_id_by_IIN(self, patient_IIN: str) -> int | None:
+        """
+        This method is used to retrieve only the 'id' of a certain patient from the DB by 'IIN' field.
+
+        Returns:
+            patient ID (int | None)
+        """
+
+        data = await self.session.execute(select(Patient.id).where(Patient.IIN == patient_IIN))
+        patient_id = data.scalar()
+
+        return patient_id
+
+    async def get_patients_by_ids(self, patient_ids: Sequence[int], columns: Sequence[str]) -> list[dict[str, Any]]:
+        """
+        This method is used to retrieve given columns of patients with given IDs, in the order of the IDs.
+
+        Returns:
+            patients (list[dict[str, Any]])
+        """
+
+        if not patient_ids:
+            return []
+
+        query = select(*(getattr(Patient, column) for column in columns)).where(Patient.id.in_(patient_ids))
+        data = await self.session.execute(query)
+        patients = {row.id: dict(row._mapping) for row in data.all()}
+
+        return [patients[patient_id] for patient_id in patient_ids if patient_id in patients]
+
+    async def search_patients(self, search_query: str, pagination: Pagination, columns: Sequence[str],
+                              scope: str = "") -> tuple[int, Sequence[dict[str, Any]]]:
         """
         This method is used to search and retrieve patients from the DB
         by a search query (any combination of: (first_name, last_name, middle_name) or IIN).
+        Only the given columns are selected. The ranking of results is cached by the scope and the query,
+        so following pages and repeated searches only fetch rows of the page by IDs.
 
         Returns:
             total (int)
-            patients (Sequence[Row[Any] | RowMapping | Any])
+            patients (Sequence[dict[str, Any]])
         """
 
-        try:
-            user_role = verify_token(token)
-            if user_role["user_role"] in ["Patient"]:
-                raise HTTPException(status_code=403, detail="Forbidden: Unauthorized role")
-        except JWTError:
-            raise HTTPException(status_code=401, detail="Invalid token")
-
-        words = search_query.lower().split()
-        conditions = [func.lower(Patient.IIN).like(f"%{word}%") for word in words]
-        conditions.extend([func.lower(Patient.first_name).like(f"%{word}%") for word in words])
-        conditions.extend([func.lower(Patient.last_name).like(f"%{word}%") for word in words])
-        conditions.extend([func.lower(Patient.middle_name).like(f"%{word}%") for word in words])
-
-        query = select(Patient, func.similarity(func.concat_ws(' ', Patient.first_name,
-                                                               Patient.last_name, Patient.middle_name),
-                                                text(':search_query')).label('similarity')). \
-            where(or_(*conditions)). \
-            order_by(text('similarity DESC')). \
-            offset(offset).limit(limit)
+        words = search_words(search_query)
+        if not words:
+            raise HTTPException(status_code=404, detail="Patients not found")
 
-        result = await self.session.execute(query, {'search_query': ' '.join(words)})
-        patients = result.scalars().all()
+        similarity = search_similarity(Patient, words)
+        sort_keys = [SortKey(similarity, descending=True), SortKey(Patient.id)]
 
-        total = await self.session.execute(select(func.count()).where(or_(*conditions)))
-        total = total.scalar()
+        ranking = await rank_search_results(self.session, Patient, words, patient_search_results, scope)
+        if ranking is not None:
+            pagination.total_strategy = "cached"
+            page = slice_ranking(ranking, pagination, sort_keys)
+            total, patients = len(ranking), await self.get_patients_by_ids([key[-1] for key in page], columns)
+        else:
+            query = select(*(getattr(Patient, column) for column in columns)).where(search_condition(Patient, words))
+            total, patients = await fetch_page(self.session, query, pagination, sort_keys,
+                                               total_cache_key=("patients.search", tuple(words)))
 
         if not patients:
             raise HTTPException(status_code=404, detail="Patients not found")
 
         return total, patients
 
-    async def create_patient(self, new_patient_data: PatientCreateHashedPassword) -> dict[str, Any]:
+    async def create_patient(self, new_patient_data: PatientCreateHashedPassword) -> dict[str, Any] | None:
         """
-        This method is used to create a patient with the given data ('PatientCreateHashedPassword' model).
+        This method is used to create a patient with the given data ('PatientCreateHashedPassword' model)
+        by a single 'INSERT ... ON CONFLICT DO NOTHING RETURNING' statement.
 
         Returns:
-            created patient (dict[str, Any])
+            created patient, or None if a patient with the same IIN already exists (dict[str, Any] | None)
+
+        Raises:
+            IntegrityError: If the doctor of the patient does not exist.
         """
 
-        new_patient = Patient(**new_patient_data.model_dump())
-        self.session.add(new_patient)
-        await self.session.flush()
-        await self.session.commit()
+        new_patient = await insert_returning(self.session, Patient, new_patient_data.model_dump(),
+                                             [getattr(Patient, column) for column in PatientRead.model_fields])
+        if new_patient is None:
+            return None
 
-        return new_patient
+        self._on_change(new_patient)
+
+        return dict(new_patient._mapping)
 
     async def update_patient(self, patient_id: int, new_data_for_patient: PatientUpdateHashedPassword) -> PatientRead:
         """
@@ -130,24 +191,53 @@ class PatientRepository:
             setattr(patient_to_update, key, value)
 
         await self.session.flush()
-        await self.session.commit()
+        self._on_change(patient_to_update)
 
         return patient_to_update
 
-    async def delete_patient(self, patient_id: int) -> int:
+    async def patch_patient(self, patient_id: int, values: dict[str, Any]) -> dict[str, Any] | None:
         """
-        This method is used to delete the existing patient with given ID.
+        This method is used to update only the given columns of the patient by a single 'UPDATE ... RETURNING'
+        statement, without loading the patient first.
 
         Returns:
-            deleted patient ID (int)
+            ID, names, IIN and the updated columns of the patient, or None if it doesn't exist (dict[str, Any] | None)
+        """
 
-        Raises:
-            HTTPException: If the patient with the given ID is not found.
+        columns = ["id", *NAME_COLUMNS, "IIN"]
+        columns += [column for column in values if column not in columns and column != "hashed_password"]
+
+        patient = await update_returning(self.session, Patient, patient_id, values,
+                                         [getattr(Patient, column) for column in columns])
+        if patient is None:
+            return None
+
+        self._on_change(patient)
+
+        return dict(patient._mapping)
+
+    async def delete_patients(self, patient_ids: Sequence[int]) -> list[int]:
         """
+        This method is used to delete the existing patients with given IDs by a single statement.
 
-        patient_to_delete = await self.get_patient_by_id(patient_id)
+        Returns:
+            IDs of the deleted patients (list[int])
+        """
 
-        await self.session.delete(patient_to_delete)
-        await self.session.commit()
+        deleted_ids = await delete_returning(self.session, Patient, patient_ids)
+        if deleted_ids:
+            self._on_delete(deleted_ids)
 
-        return patient_id
+        return deleted_ids
+
+    async def delete_patient(self, patient_id: int) -> int | None:
+        """
+        This method is used to delete the existing patient with given ID.
+
+        Returns:
+            deleted patient ID, or None if it doesn't exist (int | None)
+        """
+
+        deleted_ids = await self.delete_patients([patient_id])
+
+        return deleted_ids[0] if deleted_ids else None
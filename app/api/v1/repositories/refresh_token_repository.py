@@ -0,0 +1,64 @@
+from datetime import datetime
+from typing import Sequence, Any
+
+from sqlalchemy import select, update, delete, Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import RefreshToken
+
+
+class RefreshTokenRepository:
+    def __init__(self, session: AsyncSession) -> None:
+        self.session = session
+
+    async def create_refresh_token(self, jti: str, subject: str, user_role: str, expires_at: datetime) -> None:
+        """
+        This method is used to save the issued refresh token.
+        """
+
+        self.session.add(RefreshToken(jti=jti, subject=subject, user_role=user_role, expires_at=expires_at))
+        await self.session.flush()
+
+    async def revoke_refresh_token(self, jti: str) -> datetime | None:
+        """
+        This method is used to revoke the refresh token with given JTI, if it isn't revoked yet.
+
+        Returns:
+            expiration time of the revoked token, or None if it doesn't exist or is already revoked (datetime | None)
+        """
+
+        query = update(RefreshToken). \
+            where(RefreshToken.jti == jti, RefreshToken.revoked_at.is_(None)). \
+            values(revoked_at=datetime.now()). \
+            returning(RefreshToken.expires_at)
+
+        data = await self.session.execute(query)
+        expires_at = data.scalar()
+
+        return expires_at
+
+    async def get_revoked_refresh_tokens(self) -> Sequence[Row[Any]]:
+        """
+        This method is used to retrieve JTI and expiration time of revoked, but not yet expired refresh tokens.
+
+        Returns:
+            (jti, expires_at) rows (Sequence[Row[Any]])
+        """
+
+        query = select(RefreshToken.jti, RefreshToken.expires_at). \
+            where(RefreshToken.revoked_at.is_not(None), RefreshToken.expires_at > datetime.now())
+        data = await self.session.execute(query)
+
+        return data.all()
+
+    async def delete_expired_refresh_tokens(self) -> int:
+        """
+        This method is used to delete expired refresh tokens.
+
+        Returns:
+            number of deleted tokens (int)
+        """
+
+        data = await self.session.execute(delete(RefreshToken).where(RefreshToken.expires_at <= datetime.now()))
+
+        return data.rowcount
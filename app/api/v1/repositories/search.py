@@ -0,0 +1,136 @@
+import time
+from typing import Any, Sequence, Type
+
+from sqlalchemy import ColumnElement, func, or_, and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1.services.cache.cache_service import TTLCache
+from app.config.database import read_lag_seconds
+from app.config.env_config import SEARCH_RESULT_CACHE_SIZE, SEARCH_RESULT_CACHE_TTL_SECONDS, \
+    SEARCH_RESULT_CACHE_MAX_IDS
+from app.models.models import Patient, Doctor
+from app.models.transliteration import normalize_name
+
+IIN_LENGTH = 12
+
+# Cached instead of the ranking of searches matching more than SEARCH_RESULT_CACHE_MAX_IDS rows.
+TOO_MANY_MATCHES = object()
+
+# Rankings ((similarity, id) of all matching rows in order) by (role, normalized words), or TOO_MANY_MATCHES.
+# Repositories clear them when patients or doctors change.
+patient_search_results = TTLCache("search.patients.results", SEARCH_RESULT_CACHE_SIZE,
+                                  ttl=SEARCH_RESULT_CACHE_TTL_SECONDS)
+doctor_search_results = TTLCache("search.doctors.results", SEARCH_RESULT_CACHE_SIZE,
+                                 ttl=SEARCH_RESULT_CACHE_TTL_SECONDS)
+
+
+def search_words(search_query: str) -> list[str]:
+    """
+    This method is used to split the search query into words normalized the same way as the stored 'search_name'
+    (see 'normalize_name'), so Cyrillic and Latin spellings of a name find the same rows.
+
+    Returns:
+        normalized words (list[str])
+    """
+
+    words = (normalize_name(word) for word in search_query.split())
+
+    return [word for word in words if word]
+
+
+def iin_condition(model: Type[Patient] | Type[Doctor], word: str) -> ColumnElement:
+    """
+    This method is used to build the condition of the numeric search word: a full IIN is looked up by the unique
+    index, and a shorter fragment is treated as the beginning of the IIN and scanned as a range of the
+    'varchar_pattern_ops' index. The range is given with the pattern operators ('~>=~', '~<~') instead of
+    'LIKE :prefix', because the planner derives the range from 'LIKE' only for constant patterns, not for
+    parameters of prepared statements.
+
+    Returns:
+        condition (ColumnElement)
+    """
+
+    if len(word) == IIN_LENGTH:
+        return model.IIN == word
+
+    condition = model.IIN.op("~>=~", is_comparison=True)(word)
+
+    # The smallest string greater than all strings with the prefix, e.g. '8709' -> '871' ('999' has no bound).
+    stripped = word.rstrip("9")
+    if stripped:
+        upper_bound = stripped[:-1] + str(int(stripped[-1]) + 1)
+        condition = and_(condition, model.IIN.op("~<~", is_comparison=True)(upper_bound))
+
+    return condition
+
+
+def search_condition(model: Type[Patient] | Type[Doctor], words: Sequence[str]) -> ColumnElement:
+    """
+    This method is used to build the search condition: any of the (normalized, see 'search_words') words matches
+    the row. Numeric words (ASCII digits only, 'str.isdigit' accepts other Unicode digits too) are matched with
+    the beginning of the IIN (see 'iin_condition'), other words are parts of the stored normalized full name
+    ('search_name'), IIN contains digits only. Both columns are indexed, so the condition is answered by a bitmap OR
+    of index scans.
+
+    Returns:
+        condition (ColumnElement)
+    """
+
+    conditions = []
+    for word in words:
+        if word.isascii() and word.isdigit():
+            conditions.append(iin_condition(model, word))
+        else:
+            conditions.append(model.search_name.like(f"%{word}%"))
+
+    return or_(*conditions)
+
+
+def search_similarity(model: Type[Patient] | Type[Doctor], words: Sequence[str]) -> ColumnElement:
+    """
+    This method is used to build the relevance of the row for the search query
+    (trigram similarity of the normalized full name).
+
+    Returns:
+        similarity (ColumnElement)
+    """
+
+    return func.similarity(model.search_name, " ".join(words))
+
+
+async def rank_search_results(session: AsyncSession, model: Type[Patient] | Type[Doctor], words: Sequence[str],
+                              cache: TTLCache, scope: str) -> list[tuple[Any, ...]] | None:
+    """
+    This method is used to get the ranking of all rows matching the search words: (similarity, id) in the order of
+    search results. The ranking is cached by the scope (e.g. role of the user) and the words, so pages of repeated
+    searches only fetch their rows by IDs. Searches matching more than SEARCH_RESULT_CACHE_MAX_IDS rows aren't
+    ranked in memory. That is cached as well (TOO_MANY_MATCHES), so their following pages go straight to
+    the paginated query instead of reading the limited ranking again. A ranking read from the replica isn't cached,
+    if the cache was invalidated by a write, which the replica may not have replayed yet.
+
+    Returns:
+        ranking, or None if too many rows match (list[tuple[Any, ...]] | None)
+    """
+
+    key = (scope, tuple(words))
+    ranking = cache.get(key)
+    if ranking is TOO_MANY_MATCHES:
+        return None
+    if ranking is not None:
+        return ranking
+
+    similarity = search_similarity(model, words)
+    query = select(similarity, model.id). \
+        where(search_condition(model, words)). \
+        order_by(similarity.desc(), model.id). \
+        limit(SEARCH_RESULT_CACHE_MAX_IDS + 1)
+
+    read_at = time.time() - read_lag_seconds(session)
+    data = await session.execute(query)
+    ranking = [tuple(row) for row in data.all()]
+    if len(ranking) > SEARCH_RESULT_CACHE_MAX_IDS:
+        cache.set_if_not_invalidated_since(key, TOO_MANY_MATCHES, read_at)
+        return None
+
+    cache.set_if_not_invalidated_since(key, ranking, read_at)
+    return ranking
@@ -0,0 +1,102 @@
+from typing import Any, Sequence, Type
+
+from sqlalchemy import update, delete, any_, bindparam, Integer, Row, ColumnElement
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import Patient, Doctor, Admin
+from app.models.transliteration import search_name
+
+NAME_COLUMNS = ("first_name", "last_name", "middle_name")
+
+# SQLSTATEs of 'foreign_key_violation' and 'unique_violation'
+FOREIGN_KEY_VIOLATION = "23503"
+UNIQUE_VIOLATION = "23505"
+
+
+def _sqlstate(error: IntegrityError) -> str | None:
+    return getattr(error.orig, "pgcode", None) or getattr(error.orig, "sqlstate", None)
+
+
+def is_foreign_key_violation(error: IntegrityError) -> bool:
+    return _sqlstate(error) == FOREIGN_KEY_VIOLATION
+
+
+def is_unique_violation(error: IntegrityError) -> bool:
+    return _sqlstate(error) == UNIQUE_VIOLATION
+
+
+async def insert_returning(session: AsyncSession, model: Type[Patient] | Type[Doctor], values: dict[str, Any],
+                           returning: Sequence[ColumnElement]) -> Row | None:
+    """
+    This method is used to create a patient or a doctor by a single 'INSERT ... ON CONFLICT ("IIN") DO NOTHING
+    RETURNING' statement, so a duplicate IIN doesn't need to be checked by a separate query, and concurrent creates
+    with the same IIN can't race. Mapper events don't run for such statements, so 'search_name' is set here.
+    Violations of other constraints (e.g. a missing doctor of the patient) raise 'IntegrityError'
+    (see 'is_foreign_key_violation').
+
+    Returns:
+        created row with 'returning' columns, or None if a row with the same IIN already exists (Row | None)
+    """
+
+    values = dict(values)
+    values["search_name"] = search_name(*(values[column] for column in NAME_COLUMNS))
+
+    query = insert(model).values(**values).on_conflict_do_nothing(index_elements=[model.IIN]).returning(*returning)
+    data = await session.execute(query)
+
+    return data.one_or_none()
+
+
+async def update_returning(session: AsyncSession, model: Type[Patient] | Type[Doctor] | Type[Admin], entity_id: int,
+                           values: dict[str, Any], returning: Sequence[ColumnElement]) -> Row | None:
+    """
+    This method is used to update given columns of the row with given ID by a single 'UPDATE ... RETURNING'
+    statement, without loading the row first. Mapper events don't run for such statements, so the stored
+    'search_name' of patients and doctors is set here: within the same statement if all names are given,
+    or by a second statement from the returned row if only some of them are (then 'returning' must contain
+    all name columns). Violations of constraints (e.g. a duplicate IIN) raise 'IntegrityError'
+    (see 'is_unique_violation' and 'is_foreign_key_violation').
+
+    Returns:
+        updated row with 'returning' columns, or None if the row doesn't exist (Row | None)
+    """
+
+    values = dict(values)
+    names_changed = hasattr(model, "search_name") and any(column in values for column in NAME_COLUMNS)
+    if names_changed and all(column in values for column in NAME_COLUMNS):
+        values["search_name"] = search_name(*(values[column] for column in NAME_COLUMNS))
+
+    query = update(model).where(model.id == entity_id).values(**values).returning(*returning)
+    data = await session.execute(query)
+    row = data.one_or_none()
+
+    if row is not None and names_changed and "search_name" not in values:
+        query = update(model). \
+            where(model.id == entity_id). \
+            values(search_name=search_name(row.first_name, row.last_name, row.middle_name))
+        await session.execute(query)
+
+    return row
+
+
+async def delete_returning(session: AsyncSession, model: Type[Patient] | Type[Doctor], ids: Sequence[int]) -> \
+        list[int]:
+    """
+    This method is used to delete rows with given IDs by a single 'DELETE ... WHERE id = ANY(:ids) RETURNING id'
+    statement, without loading them first. IDs are sent as one array parameter, so the statement is the same
+    for any number of IDs.
+
+    Returns:
+        IDs of the deleted rows (list[int])
+    """
+
+    query = delete(model). \
+        where(model.id == any_(bindparam("ids", list(ids), type_=ARRAY(Integer)))). \
+        returning(model.id). \
+        execution_options(synchronize_session=False)
+    data = await session.execute(query)
+
+    return list(data.scalars().all())
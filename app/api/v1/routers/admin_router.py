@@ -2,10 +2,11 @@ from typing import List
 
 from fastapi import APIRouter, Depends
 
-from app.api.v1.auth.auth_router import oauth2_scheme
+from app.api.v1.auth.jwt.token_schema import Principal
 from app.api.v1.services.admin_service import AdminService
-from app.dependencies import get_admin_service
-from app.schemas.schemas import AdminRead, AdminCreateRawPassword, AdminUpdateRawPassword
+from app.dependencies import get_admin_service, get_current_principal
+from app.schemas.schemas import AdminRead, AdminCreateRawPassword, AdminUpdateRawPassword, AdminPatch, \
+    AdminPatchResult
 
 router = APIRouter(
     tags=["Admins"],
@@ -14,7 +15,7 @@ router = APIRouter(
 
 
 @router.get("/admins", response_model=List[AdminRead])
-async def get_admins(token: str = Depends(oauth2_scheme), admin_service: AdminService = Depends(get_admin_service)):
+async def get_admins(principal: Principal = Depends(get_current_principal), admin_service: AdminService = Depends(get_admin_service)):
     """
     This method is used to retrieve all admins from the DB with given page and page size.
 
@@ -22,13 +23,13 @@ async def get_admins(token: str = Depends(oauth2_scheme), admin_service: AdminSe
         admins (List[AdminRead])
     """
 
-    admins = await admin_service.get_admins(token)
+    admins = await admin_service.get_admins(principal)
 
     return admins
 
 
 @router.get("/admins/{admin_id}", response_model=AdminRead)
-async def get_admin_by_id(admin_id: int, token: str = Depends(oauth2_scheme),
+async def get_admin_by_id(admin_id: int, principal: Principal = Depends(get_current_principal),
                           admin_service: AdminService = Depends(get_admin_service)):
     """
     This method is used to retrieve a certain admin from the DB.
@@ -37,14 +38,14 @@ async def get_admin_by_id(admin_id: int, token: str = Depends(oauth2_scheme),
         admin (AdminRead)
     """
 
-    admin = await admin_service.get_admin_by_id(admin_id, token)
+    admin = await admin_service.get_admin_by_id(admin_id, principal)
 
     return admin
 
 
 # TODO: Move this endpoint to the new 'auth' module as a part of login-registering logic.
 @router.post("/admins/register", response_model=AdminRead)
-async def register_admin(new_admin_data: AdminCreateRawPassword, token: str = Depends(oauth2_scheme),
+async def register_admin(new_admin_data: AdminCreateRawPassword, principal: Principal = Depends(get_current_principal),
                          admin_service: AdminService = Depends(get_admin_service)):
     """
     This method is used to create an admin with the given data ('AdminCreate' model).
@@ -52,13 +53,13 @@ async def register_admin(new_admin_data: AdminCreateRawPassword, token: str = De
     Returns:
         created admin(dict[str, Any])
     """
-    new_admin = await admin_service.register_admin(new_admin_data, token)
+    new_admin = await admin_service.register_admin(new_admin_data, principal)
 
     return new_admin
 
 
 @router.put("/admins/{admin_id}", response_model=AdminRead)
-async def update_admin(admin_id: int, new_data_for_admin: AdminUpdateRawPassword, token: str = Depends(oauth2_scheme),
+async def update_admin(admin_id: int, new_data_for_admin: AdminUpdateRawPassword, principal: Principal = Depends(get_current_principal),
                        admin_service: AdminService = Depends(get_admin_service)):
     """
     This method is used to update the existing admin data with the new one ('AdminUpdate' model).
@@ -67,12 +68,25 @@ async def update_admin(admin_id: int, new_data_for_admin: AdminUpdateRawPassword
         updated admin (dict[str, Any])
     """
 
-    admin = await admin_service.update_admin(new_data_for_admin, admin_id, token)
+    admin = await admin_service.update_admin(new_data_for_admin, admin_id, principal)
     return admin
 
 
+@router.patch("/admins/{admin_id}", response_model=AdminPatchResult, response_model_exclude_unset=True)
+async def patch_admin(admin_id: int, patch: AdminPatch, principal: Principal = Depends(get_current_principal),
+                      admin_service: AdminService = Depends(get_admin_service)):
+    """
+    This method is used to update only the given fields of the existing admin ('AdminPatch' model).
+
+    Returns:
+        ID and the updated fields of the admin (AdminPatchResult)
+    """
+
+    return await admin_service.patch_admin(admin_id, principal, patch)
+
+
 @router.delete("/admins/delete/{admin_id}", response_model=None)
-async def delete_admin(admin_id: int, token: str = Depends(oauth2_scheme),
+async def delete_admin(admin_id: int, principal: Principal = Depends(get_current_principal),
                        admin_service: AdminService = Depends(get_admin_service)) -> dict:
     """
     This method is used to delete the existing admin with given id.
@@ -81,6 +95,6 @@ async def delete_admin(admin_id: int, token: str = Depends(oauth2_scheme),
         deleted admin ID (int)
     """
 
-    admin_to_delete = await admin_service.delete_admin(admin_id, token)
+    admin_to_delete = await admin_service.delete_admin(admin_id, principal)
 
     return admin_to_delete
@@ -1,15 +1,15 @@
 from typing import List
 
 from fastapi import APIRouter, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.v1.auth.auth_router import oauth2_scheme
-from app.api.v1.repositories.doctor_repository import DoctorRepository
+from app.api.v1.auth.jwt.token_schema import Principal
 from app.api.v1.services.doctor_service import DoctorService
 from app.api.v1.services.pagination.pagination_service import Pagination
-from app.dependencies import get_doctor_service, get_async_session
+from app.config.env_config import DOCTORS_TOTAL_STRATEGY, DOCTORS_SEARCH_TOTAL_STRATEGY, DOCTOR_PATIENTS_TOTAL_STRATEGY
+from app.dependencies import get_doctor_service, get_current_principal
 from app.schemas.schemas import DoctorRead, DoctorCreateRawPassword, DoctorUpdateRawPassword, PatientRead, \
-    DoctorReadFullName, DoctorPaginationResult, PatientPaginationResult
+    DoctorReadFullName, DoctorPaginationResult, PatientListPaginationResult, AutocompleteItem, DoctorPatch, \
+    DoctorPatchResult, BulkDeleteRequest, BulkDeleteResult
 
 router = APIRouter(
     tags=["Doctor"],
@@ -18,7 +18,7 @@ router = APIRouter(
 
 
 @router.get("/doctors_without_pagination", response_model=List[DoctorRead])
-async def get_doctors_without_pagination(token: str = Depends(oauth2_scheme), doctor_service: DoctorService = Depends(get_doctor_service)):
+async def get_doctors_without_pagination(principal: Principal = Depends(get_current_principal), doctor_service: DoctorService = Depends(get_doctor_service)):
     """
     This method is used to retrieve all doctors from the DB without pagination.
 
@@ -26,14 +26,14 @@ async def get_doctors_without_pagination(token: str = Depends(oauth2_scheme), do
         doctors (List[DoctorRead])
     """
 
-    doctors = await doctor_service.get_doctors_without_pagination(token)
+    doctors = await doctor_service.get_doctors_without_pagination(principal)
 
     return doctors
 
 
 @router.get("/doctors", response_model=DoctorPaginationResult)
-async def get_doctors(token: str = Depends(oauth2_scheme), doctor_service: DoctorService = Depends(get_doctor_service),
-                      page: int = 1, page_size: int = 10):
+async def get_doctors(principal: Principal = Depends(get_current_principal), doctor_service: DoctorService = Depends(get_doctor_service),
+                      page: int = 1, page_size: int = 10, cursor: str | None = None):
     """
     This method is used to retrieve all doctors from the DB with given page and page size.
 
@@ -41,14 +41,14 @@ async def get_doctors(token: str = Depends(oauth2_scheme), doctor_service: Docto
         doctors (DoctorPaginationResult)
     """
 
-    pagination = Pagination(page, page_size)
-    total, doctors = await doctor_service.get_doctors(token, pagination.offset, page_size)
+    pagination = Pagination(page, page_size, cursor, DOCTORS_TOTAL_STRATEGY)
+    total, doctors = await doctor_service.get_doctors(principal, pagination)
 
     return pagination.paginate(total, doctors)
 
 
 @router.get("/doctors/{doctor_id}", response_model=DoctorRead)
-async def get_doctor_by_id(doctor_id: int , token: str = Depends(oauth2_scheme),
+async def get_doctor_by_id(doctor_id: int , principal: Principal = Depends(get_current_principal),
                            doctor_service: DoctorService = Depends(get_doctor_service)):
     """
     This method is used to retrieve a certain doctor from the DB.
@@ -57,15 +57,15 @@ async def get_doctor_by_id(doctor_id: int , token: str = Depends(oauth2_scheme),
         doctor (DoctorRead)
     """
 
-    doctor = await doctor_service.get_doctor_by_id(doctor_id, token)
+    doctor = await doctor_service.get_doctor_by_id(doctor_id, principal)
 
     return doctor
 
 
 @router.get("/doctors/search/{search_query}", response_model=DoctorPaginationResult)
-async def search_doctors(search_query: str, token: str = Depends(oauth2_scheme),
-                          page: int = 1, page_size: int = 10,
-                          session: AsyncSession = Depends(get_async_session)):
+async def search_doctors(search_query: str, principal: Principal = Depends(get_current_principal),
+                         doctor_service: DoctorService = Depends(get_doctor_service),
+                         page: int = 1, page_size: int = 10, cursor: str | None = None):
     """
     This method is used to search and retrieve doctors from the DB
     by a search query (any combination of: (first_name, last_name, middle_name) or IIN).
@@ -73,15 +73,29 @@ async def search_doctors(search_query: str, token: str = Depends(oauth2_scheme),
     Returns:
         doctors (DoctorPaginationResult)
     """
-    doctor_repository = DoctorRepository(session)
-    pagination = Pagination(page, page_size)
-    total, doctors = await doctor_repository.search_doctors(search_query, token, pagination.offset, page_size)
+    pagination = Pagination(page, page_size, cursor, DOCTORS_SEARCH_TOTAL_STRATEGY)
+    total, doctors = await doctor_service.search_doctors(search_query, principal, pagination)
 
     return pagination.paginate(total, doctors)
 
 
+@router.get("/doctors/autocomplete/{query}", response_model=List[AutocompleteItem])
+async def autocomplete_doctors(query: str, principal: Principal = Depends(get_current_principal),
+                               doctor_service: DoctorService = Depends(get_doctor_service),
+                               limit: int = 10):
+    """
+    This method is used to suggest doctors by the beginning of their first, last or middle name or IIN
+    (e.g. for typeahead). It doesn't query the DB.
+
+    Returns:
+        suggested doctors (List[AutocompleteItem])
+    """
+
+    return await doctor_service.autocomplete_doctors(query, principal, limit)
+
+
 @router.get("/doctors/IIN/{doctor_IIN}", response_model=DoctorRead)
-async def get_doctor_by_IIN(doctor_IIN: str, token: str = Depends(oauth2_scheme),
+async def get_doctor_by_IIN(doctor_IIN: str, principal: Principal = Depends(get_current_principal),
                             doctor_service: DoctorService = Depends(get_doctor_service)):
     """
     This method is used to retrieve a certain doctor from the DB.
@@ -90,13 +104,13 @@ async def get_doctor_by_IIN(doctor_IIN: str, token: str = Depends(oauth2_scheme)
         doctor (DoctorRead)
     """
 
-    doctor = await doctor_service.get_doctor_by_IIN(doctor_IIN, token)
+    doctor = await doctor_service.get_doctor_by_IIN(doctor_IIN, principal)
 
     return doctor
 
 
 @router.get("/doctors/full_name/{doctor_id}", response_model=DoctorReadFullName)
-async def get_doctor_full_name_by_id(doctor_id: int, token: str = Depends(oauth2_scheme),
+async def get_doctor_full_name_by_id(doctor_id: int, principal: Principal = Depends(get_current_principal),
                                      doctor_service: DoctorService = Depends(get_doctor_service)):
     """
     This method is used to retrieve a certain doctor's full name from the DB.
@@ -105,31 +119,34 @@ async def get_doctor_full_name_by_id(doctor_id: int, token: str = Depends(oauth2
         Doctor's full name (DoctorReadFullName)
     """
 
-    doctor = await doctor_service.get_doctor_full_name_by_id(doctor_id, token)
+    doctor = await doctor_service.get_doctor_full_name_by_id(doctor_id, principal)
 
     return doctor
 
 
-@router.get("/doctors/{doctor_IIN}/patients", response_model=PatientPaginationResult)
-async def get_doctor_patients(doctor_IIN: str, token: str = Depends(oauth2_scheme),
+@router.get("/doctors/{doctor_IIN}/patients", response_model=PatientListPaginationResult,
+            response_model_exclude_unset=True)
+async def get_doctor_patients(doctor_IIN: str, principal: Principal = Depends(get_current_principal),
                               doctor_service: DoctorService = Depends(get_doctor_service),
-                              page: int = 1, page_size: int = 10):
+                              page: int = 1, page_size: int = 10, cursor: str | None = None,
+                              fields: str | None = None):
     """
     This method retrieve list of doctor's patients, assigned to the doctor with this ID.
+    Patients contain only the requested fields (comma-separated 'fields'), or the short list fields by default.
 
     Returns:
-        List[PatientRead]: List of patients, assigned to the doctor
+        PatientListPaginationResult: List of patients, assigned to the doctor
     """
 
-    pagination = Pagination(page, page_size)
-    total, doctor_patients = await doctor_service.get_doctor_patients(doctor_IIN, token, pagination.offset, page_size)
+    pagination = Pagination(page, page_size, cursor, DOCTOR_PATIENTS_TOTAL_STRATEGY)
+    total, doctor_patients = await doctor_service.get_doctor_patients(doctor_IIN, principal, pagination, fields)
 
     return pagination.paginate(total, doctor_patients)
 
 
 # TODO: Move and rename this endpoint to the new 'auth' module as a part of login-registering logic.
 @router.post("/doctors/register", response_model=DoctorRead)
-async def create_doctor(new_doctor_data: DoctorCreateRawPassword, token: str = Depends(oauth2_scheme),  doctor_service: DoctorService = Depends(get_doctor_service)):
+async def create_doctor(new_doctor_data: DoctorCreateRawPassword, principal: Principal = Depends(get_current_principal),  doctor_service: DoctorService = Depends(get_doctor_service)):
     """
     This method is used to create a doctor with the given data ('DoctorCreateRawPassword' model).
 
@@ -137,13 +154,13 @@ async def create_doctor(new_doctor_data: DoctorCreateRawPassword, token: str = D
         created doctor (dict[str, Any])
     """
 
-    new_doctor = await doctor_service.create_doctor(new_doctor_data, token)
+    new_doctor = await doctor_service.create_doctor(new_doctor_data, principal)
 
     return new_doctor
 
 
 @router.put("/doctors/{doctor_id}", response_model=DoctorRead)
-async def update_doctor(new_data_for_doctor: DoctorUpdateRawPassword, doctor_id: int, token: str = Depends(oauth2_scheme),
+async def update_doctor(new_data_for_doctor: DoctorUpdateRawPassword, doctor_id: int, principal: Principal = Depends(get_current_principal),
                         doctor_service: DoctorService = Depends(get_doctor_service)):
     """
     This method is used to update the existing doctor data with the new one ('DoctorUpdateRawPassword' model).
@@ -152,13 +169,26 @@ async def update_doctor(new_data_for_doctor: DoctorUpdateRawPassword, doctor_id:
         updated doctor (dict[str, Any])
     """
 
-    doctor_to_update = await doctor_service.update_doctor(new_data_for_doctor, doctor_id, token)
+    doctor_to_update = await doctor_service.update_doctor(new_data_for_doctor, doctor_id, principal)
 
     return doctor_to_update
 
 
+@router.patch("/doctors/{doctor_id}", response_model=DoctorPatchResult, response_model_exclude_unset=True)
+async def patch_doctor(doctor_id: int, patch: DoctorPatch, principal: Principal = Depends(get_current_principal),
+                       doctor_service: DoctorService = Depends(get_doctor_service)):
+    """
+    This method is used to update only the given fields of the existing doctor ('DoctorPatch' model).
+
+    Returns:
+        ID and the updated fields of the doctor (DoctorPatchResult)
+    """
+
+    return await doctor_service.patch_doctor(doctor_id, principal, patch)
+
+
 @router.delete("/doctors/delete/{doctor_id}", response_model=None)
-async def delete_doctor(doctor_id: int, token: str = Depends(oauth2_scheme),
+async def delete_doctor(doctor_id: int, principal: Principal = Depends(get_current_principal),
                         doctor_service: DoctorService = Depends(get_doctor_service)) -> dict:
     """
     This method is used to delete the existing doctor with given id.
@@ -167,7 +197,19 @@ async def delete_doctor(doctor_id: int, token: str = Depends(oauth2_scheme),
         deleted doctor ID (int)
     """
 
-    doctor_to_delete = await doctor_service.delete_doctor(doctor_id, token)
+    doctor_to_delete = await doctor_service.delete_doctor(doctor_id, principal)
 
     return doctor_to_delete
 
+
+@router.post("/doctors/bulk_delete", response_model=BulkDeleteResult)
+async def delete_doctors(request: BulkDeleteRequest, principal: Principal = Depends(get_current_principal),
+                         doctor_service: DoctorService = Depends(get_doctor_service)):
+    """
+    This method is used to delete the existing doctors with given IDs at once (for admins only).
+
+    Returns:
+        IDs of the deleted doctors and IDs, which don't exist (BulkDeleteResult)
+    """
+
+    return await doctor_service.delete_doctors(request, principal)
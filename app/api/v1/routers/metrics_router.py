@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Depends
+
+from app.api.v1.auth.auth import forbid_roles
+from app.api.v1.auth.jwt.token_schema import Principal
+from app.api.v1.services.metrics.metrics_service import metrics
+from app.dependencies import get_current_principal
+
+router = APIRouter(
+    tags=["Metrics"],
+    prefix="/api/v1"
+)
+
+
+@router.get("/metrics", response_model=None)
+async def get_metrics(principal: Principal = Depends(get_current_principal)) -> dict:
+    """
+    This method is used to retrieve in-process metrics (counters, gauges and timings) of the current worker.
+
+    Returns:
+        metrics (dict)
+    """
+
+    forbid_roles(principal, ["Patient", "Doctor"])
+
+    return metrics.snapshot()
@@ -1,14 +1,15 @@
 from typing import List
 
 from fastapi import APIRouter, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.v1.auth.auth_router import oauth2_scheme
+from app.api.v1.auth.jwt.token_schema import Principal
 from app.api.v1.services.pagination.pagination_service import Pagination
 from app.api.v1.services.patient_service import PatientService
-from app.dependencies import get_patient_service, get_async_session
-from app.schemas.schemas import PatientRead, PatientCreateRawPassword, PatientUpdateRawPassword, PatientPaginationResult
-from app.api.v1.repositories.patient_repository import PatientRepository
+from app.config.env_config import PATIENTS_TOTAL_STRATEGY, PATIENTS_SEARCH_TOTAL_STRATEGY
+from app.dependencies import get_patient_service, get_current_principal
+from app.schemas.schemas import PatientRead, PatientCreateRawPassword, PatientUpdateRawPassword, \
+    PatientListPaginationResult, AutocompleteItem, PatientPatch, PatientPatchResult, BulkDeleteRequest, \
+    BulkDeleteResult
 
 router = APIRouter(
     tags=["Patient"],
@@ -16,24 +17,25 @@ router = APIRouter(
 )
 
 
-@router.get("/patients", response_model=PatientPaginationResult)
-async def get_patients(token: str = Depends(oauth2_scheme),
+@router.get("/patients", response_model=PatientListPaginationResult, response_model_exclude_unset=True)
+async def get_patients(principal: Principal = Depends(get_current_principal),
                        patient_service: PatientService = Depends(get_patient_service),
-                       page: int = 1, page_size: int = 10):
+                       page: int = 1, page_size: int = 10, cursor: str | None = None, fields: str | None = None):
     """
     This method is used to retrieve all patients from the DB with given page and page size.
+    Patients contain only the requested fields (comma-separated 'fields'), or the short list fields by default.
 
     Returns:
-        patients (PatientPaginationResult)
+        patients (PatientListPaginationResult)
     """
-    pagination = Pagination(page, page_size)
-    total, patients = await patient_service.get_patients(token, pagination.offset, page_size)
+    pagination = Pagination(page, page_size, cursor, PATIENTS_TOTAL_STRATEGY)
+    total, patients = await patient_service.get_patients(principal, pagination, fields)
 
     return pagination.paginate(total, patients)
 
 
 @router.get("/patients/{patient_id}", response_model=PatientRead)
-async def get_patient_by_id(patient_id: int, token: str = Depends(oauth2_scheme),
+async def get_patient_by_id(patient_id: int, principal: Principal = Depends(get_current_principal),
                             patient_service: PatientService = Depends(get_patient_service)):
     """
     This method is used to retrieve a certain patient from the DB.
@@ -42,13 +44,13 @@ async def get_patient_by_id(patient_id: int, token: str = Depends(oauth2_scheme)
         patient (PatientRead)
     """
 
-    patient = await patient_service.get_patient_by_id(patient_id, token)
+    patient = await patient_service.get_patient_by_id(patient_id, principal)
 
     return patient
 
 
 @router.get("/patients/IIN/{patient_IIN}", response_model=PatientRead)
-async def get_patient_by_IIN(patient_IIN: str, token: str = Depends(oauth2_scheme),
+async def get_patient_by_IIN(patient_IIN: str, principal: Principal = Depends(get_current_principal),
                              patient_service: PatientService = Depends(get_patient_service)):
     """
     This method is used to retrieve a certain patient from the DB by his IIN.
@@ -57,31 +59,47 @@ async def get_patient_by_IIN(patient_IIN: str, token: str = Depends(oauth2_schem
         patient (PatientRead)
     """
 
-    patient = await patient_service.get_patient_by_IIN(patient_IIN, token)
+    patient = await patient_service.get_patient_by_IIN(patient_IIN, principal)
 
     return patient
 
 
-@router.get("/patients/search/{search_query}", response_model=PatientPaginationResult)
-async def search_patients(search_query: str, token: str = Depends(oauth2_scheme),
-                          page: int = 1, page_size: int = 10,
-                          session: AsyncSession = Depends(get_async_session)):
+@router.get("/patients/search/{search_query}", response_model=PatientListPaginationResult,
+            response_model_exclude_unset=True)
+async def search_patients(search_query: str, principal: Principal = Depends(get_current_principal),
+                          patient_service: PatientService = Depends(get_patient_service),
+                          page: int = 1, page_size: int = 10, cursor: str | None = None, fields: str | None = None):
     """
     This method is used to search and retrieve patients from the DB
     by a search query (any combination of: (first_name, last_name, middle_name) or IIN).
+    Patients contain only the requested fields (comma-separated 'fields'), or the short list fields by default.
 
     Returns:
-        patients (PatientPaginationResult)
+        patients (PatientListPaginationResult)
     """
-    patient_repository = PatientRepository(session)
-    pagination = Pagination(page, page_size)
-    total, patients = await patient_repository.search_patients(search_query, token, pagination.offset, page_size)
+    pagination = Pagination(page, page_size, cursor, PATIENTS_SEARCH_TOTAL_STRATEGY)
+    total, patients = await patient_service.search_patients(search_query, principal, pagination, fields)
 
     return pagination.paginate(total, patients)
 
 
+@router.get("/patients/autocomplete/{query}", response_model=List[AutocompleteItem])
+async def autocomplete_patients(query: str, principal: Principal = Depends(get_current_principal),
+                                patient_service: PatientService = Depends(get_patient_service),
+                                limit: int = 10):
+    """
+    This method is used to suggest patients by the beginning of their first, last or middle name or IIN
+    (e.g. for typeahead). It doesn't query the DB.
+
+    Returns:
+        suggested patients (List[AutocompleteItem])
+    """
+
+    return await patient_service.autocomplete_patients(query, principal, limit)
+
+
 @router.post("/patients/register", response_model=PatientRead)
-async def create_patient(new_patient_data: PatientCreateRawPassword, token: str = Depends(oauth2_scheme),
+async def create_patient(new_patient_data: PatientCreateRawPassword, principal: Principal = Depends(get_current_principal),
                          patient_service: PatientService = Depends(get_patient_service)):
     """
     This method is used to create a patient with the given data ('PatientCreate' model).
@@ -90,14 +108,14 @@ async def create_patient(new_patient_data: PatientCreateRawPassword, token: str
         created patient (dict[str, Any])
     """
 
-    new_patient = await patient_service.create_patient(token, new_patient_data)
+    new_patient = await patient_service.create_patient(principal, new_patient_data)
 
     return new_patient
 
 
 @router.put("/patients/{patient_id}", response_model=PatientRead)
 async def update_patient(patient_id: int, new_data_for_patient: PatientUpdateRawPassword,
-                         token: str = Depends(oauth2_scheme),
+                         principal: Principal = Depends(get_current_principal),
                          patient_service: PatientService = Depends(get_patient_service)):
     """
     This method is used to update the existing patient data with the new one ('PatientUpdateRawPassword' model).
@@ -106,13 +124,26 @@ async def update_patient(patient_id: int, new_data_for_patient: PatientUpdateRaw
         updated patient (dict[str, Any])
     """
 
-    patient_to_update = await patient_service.update_patient(patient_id, token, new_data_for_patient)
+    patient_to_update = await patient_service.update_patient(patient_id, principal, new_data_for_patient)
 
     return patient_to_update
 
 
+@router.patch("/patients/{patient_id}", response_model=PatientPatchResult, response_model_exclude_unset=True)
+async def patch_patient(patient_id: int, patch: PatientPatch, principal: Principal = Depends(get_current_principal),
+                        patient_service: PatientService = Depends(get_patient_service)):
+    """
+    This method is used to update only the given fields of the existing patient ('PatientPatch' model).
+
+    Returns:
+        ID and the updated fields of the patient (PatientPatchResult)
+    """
+
+    return await patient_service.patch_patient(patient_id, principal, patch)
+
+
 @router.delete("/patients/delete/{patient_id}", response_model=None)
-async def delete_patient(patient_id: int, token: str = Depends(oauth2_scheme),
+async def delete_patient(patient_id: int, principal: Principal = Depends(get_current_principal),
                          patient_service: PatientService = Depends(get_patient_service)) -> dict:
     """
     This method is used to delete the existing patient with given id.
@@ -121,6 +152,19 @@ async def delete_patient(patient_id: int, token: str = Depends(oauth2_scheme),
         A dictionary containing the deleted patient ID and a message (dict)
     """
 
-    result = await patient_service.delete_patient(patient_id, token)
+    result = await patient_service.delete_patient(patient_id, principal)
 
     return result
+
+
+@router.post("/patients/bulk_delete", response_model=BulkDeleteResult)
+async def delete_patients(request: BulkDeleteRequest, principal: Principal = Depends(get_current_principal),
+                          patient_service: PatientService = Depends(get_patient_service)):
+    """
+    This method is used to delete the existing patients with given IDs at once (for admins only).
+
+    Returns:
+        IDs of the deleted patients and IDs, which don't exist (BulkDeleteResult)
+    """
+
+    return await patient_service.delete_patients(request, principal)
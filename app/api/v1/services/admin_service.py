@@ -1,26 +1,22 @@
 from typing import Sequence, Any
 
 from fastapi import HTTPException
-from jose.exceptions import JWTError
-from passlib.context import CryptContext
+from sqlalchemy.exc import IntegrityError
 
 from app.schemas.schemas import AdminRead, AdminCreateRawPassword, AdminCreateHashedPassword, \
-    AdminUpdateRawPassword, AdminUpdateHashedPassword
-from ..auth.auth import verify_token
+    AdminUpdateRawPassword, AdminUpdateHashedPassword, AdminPatch
+from ..auth.auth import forbid_roles, forget_unknown_user
+from ..auth.jwt.token_schema import Principal
+from ..auth.password import hash_password
 from ..repositories.admin_repository import AdminRepository
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-
-def hash_password(password: str):
-    return pwd_context.hash(password)
+from ..repositories.writes import is_unique_violation
 
 
 class AdminService:
     def __init__(self, admin_repository: AdminRepository) -> None:
         self.admin_repository = admin_repository
 
-    async def get_admins(self, token: str) -> Sequence[AdminRead]:
+    async def get_admins(self, principal: Principal) -> Sequence[AdminRead]:
         """
         This method is used to retrieve all admins from the DB.
 
@@ -28,16 +24,11 @@ class AdminService:
             admins (Sequence[AdminRead])
         """
 
-        try:
-            user_role = verify_token(token)
-            if user_role["user_role"] in ["Patient", "Doctor"]:
-                raise HTTPException(status_code=403, detail="Forbidden: Unauthorized role")
-        except JWTError:
-            raise HTTPException(status_code=401, detail="Invalid token")
+        forbid_roles(principal, ["Patient", "Doctor"])
 
         return await self.admin_repository.get_admins()
 
-    async def get_admin_by_id(self, admin_id: int, token: str) -> AdminRead:
+    async def get_admin_by_id(self, admin_id: int, principal: Principal) -> AdminRead:
         """
         This method is used to retrieve a certain admin from the DB by his 'id' field.
 
@@ -47,15 +38,9 @@ class AdminService:
         Raises:
             HTTPException (404): if the admin with given ID does not exist.
             HTTPException (403): if the role isn't admin
-            JWTError: if the token isn't validate or wrong
         """
 
-        try:
-            user_role = verify_token(token)
-            if user_role["user_role"] in ["Patient", "Doctor"]:
-                raise HTTPException(status_code=403, detail="Forbidden: Unauthorized role")
-        except JWTError:
-            raise HTTPException(status_code=401, detail="Invalid token")
+        forbid_roles(principal, ["Patient", "Doctor"])
 
         admin = await self.admin_repository.get_admin_by_id(admin_id)
 
@@ -64,7 +49,7 @@ class AdminService:
 
         return admin
 
-    async def register_admin(self, raw_admin_data: AdminCreateRawPassword, token: str) -> dict[str, Any]:
+    async def register_admin(self, raw_admin_data: AdminCreateRawPassword, principal: Principal) -> dict[str, Any]:
         """
         This method is used to create an admin with the given data ('AdminCreateRawPassword' model).
         Moreover, this method:
@@ -80,19 +65,14 @@ class AdminService:
             HTTPException (409): if admin with given username already exists in the DB.
         """
 
-        try:
-            user_role = verify_token(token)
-            if user_role["user_role"] in ["Patient", "Doctor"]:
-                raise HTTPException(status_code=403, detail="Forbidden: Unauthorized role")
-        except JWTError:
-            raise HTTPException(status_code=401, detail="Invalid token")
+        forbid_roles(principal, ["Patient", "Doctor"])
 
         # Checking if admin with provided username already exists in the DB.
         already_existing_admin_with_provided_username = await self.admin_repository.get_admin_by_username(raw_admin_data.username)
         if already_existing_admin_with_provided_username:
             raise HTTPException(status_code=409, detail=f"Admin with username {raw_admin_data.username} already exists.")
 
-        hashed_password = hash_password(raw_admin_data.password)
+        hashed_password = await hash_password(raw_admin_data.password)
 
         admin_data = raw_admin_data.model_dump()
         admin_data["hashed_password"] = hashed_password
@@ -100,9 +80,12 @@ class AdminService:
 
         admin_with_hashed_password = AdminCreateHashedPassword(**admin_data)
 
-        return await self.admin_repository.register_admin(admin_with_hashed_password)
+        new_admin = await self.admin_repository.register_admin(admin_with_hashed_password)
+        forget_unknown_user(self.admin_repository.session, "Admin", raw_admin_data.username)
+
+        return new_admin
 
-    async def update_admin(self, new_data_for_admin: AdminUpdateRawPassword, admin_id: int, token: str) -> AdminRead:
+    async def update_admin(self, new_data_for_admin: AdminUpdateRawPassword, admin_id: int, principal: Principal) -> AdminRead:
         """
         This method is used to update the existing admin data with the new one ('AdminUpdateRawPassword' model).
 
@@ -110,18 +93,13 @@ class AdminService:
             updated admin (dict[str, Any])
         """
 
-        try:
-            user_role = verify_token(token)
-            if user_role["user_role"] in ["Patient", "Doctor"]:
-                raise HTTPException(status_code=403, detail="Forbidden: Unauthorized role")
-        except JWTError:
-            raise HTTPException(status_code=401, detail="Invalid token")
+        forbid_roles(principal, ["Patient", "Doctor"])
 
         admin_to_update = await self.admin_repository.get_admin_by_id(admin_id)
         if admin_to_update is None:
             raise HTTPException(status_code=404, detail=f"Admin with id {admin_id} does not exist.")
 
-        hashed_password = hash_password(new_data_for_admin.password)
+        hashed_password = await hash_password(new_data_for_admin.password)
 
         admin_data = new_data_for_admin.model_dump()
         admin_data["hashed_password"] = hashed_password
@@ -129,9 +107,51 @@ class AdminService:
 
         admin_with_hashed_password = AdminUpdateHashedPassword(**admin_data)
 
-        return await self.admin_repository.update_admin(admin_with_hashed_password, admin_id)
+        updated_admin = await self.admin_repository.update_admin(admin_with_hashed_password, admin_id)
+        forget_unknown_user(self.admin_repository.session, "Admin", new_data_for_admin.username)
+
+        return updated_admin
+
+    async def patch_admin(self, admin_id: int, principal: Principal, patch: AdminPatch) -> dict[str, Any]:
+        """
+        This method is used to update only the given fields of the existing admin ('AdminPatch' model).
+        The password is hashed only if it's given.
+
+        Returns:
+            ID and the updated fields of the admin (dict[str, Any])
+
+        Raises:
+            HTTPException (400): If no fields are given.
+            HTTPException (404): If the admin with given ID does not exist.
+            HTTPException (409): If an admin with given username already exists.
+        """
+
+        forbid_roles(principal, ["Patient", "Doctor"])
+
+        values = patch.model_dump(exclude_unset=True)
+        if not values:
+            raise HTTPException(status_code=400, detail="No fields to update.")
+
+        if "password" in values:
+            values["hashed_password"] = await hash_password(values.pop("password"))
 
-    async def delete_admin(self, admin_id: int, token: str) -> dict:
+        try:
+            admin = await self.admin_repository.patch_admin(admin_id, values)
+        except IntegrityError as error:
+            if is_unique_violation(error):
+                raise HTTPException(status_code=409,
+                                    detail=f"Admin with username {values['username']} already exists.")
+            raise
+
+        if admin is None:
+            raise HTTPException(status_code=404, detail=f"Admin with id {admin_id} does not exist.")
+
+        if "username" in values:
+            forget_unknown_user(self.admin_repository.session, "Admin", values["username"])
+
+        return {key: admin[key] for key in ["id", *values] if key in admin}
+
+    async def delete_admin(self, admin_id: int, principal: Principal) -> dict:
         """
         This method is used to delete the existing admin with given id.
 
@@ -142,12 +162,7 @@ class AdminService:
             HTTPException (404): If the admin with given ID does not exist.
         """
 
-        try:
-            user_role = verify_token(token)
-            if user_role["user_role"] in ["Patient", "Doctor"]:
-                raise HTTPException(status_code=403, detail="Forbidden: Unauthorized role")
-        except JWTError:
-            raise HTTPException(status_code=401, detail="Invalid token")
+        forbid_roles(principal, ["Patient", "Doctor"])
 
         admin_to_delete = await self.admin_repository.get_admin_by_id(admin_id)
         if admin_to_delete is None:
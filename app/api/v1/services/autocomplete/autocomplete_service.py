@@ -0,0 +1,212 @@
+import asyncio
+import bisect
+import heapq
+from typing import Awaitable, Callable, Iterable, Tuple, Type
+
+from sqlalchemy import select
+
+from app.api.v1.services.metrics.metrics_service import metrics
+from app.config.database import async_session_maker
+from app.config.env_config import AUTOCOMPLETE_REFRESH_INTERVAL_SECONDS
+from app.models.models import Patient, Doctor
+from app.models.transliteration import normalize_name
+
+# (id, first_name, last_name, middle_name, IIN)
+Entry = Tuple[int, str, str, str, str]
+
+# Terms of a rebuilt index are sorted by chunks of this size and merged, so the thread building the index doesn't
+# hold the GIL (and stall the event loop) for the whole sort.
+SORT_CHUNK_SIZE = 50000
+
+
+class PrefixIndex:
+    """
+    This class is used to suggest patients or doctors by the beginning of their first, last or middle name or IIN.
+    Terms are normalized like the stored search names (see 'normalize_name'), so Latin transliterations suggest
+    Cyrillic names. They are kept in a sorted array, so all terms with the given prefix are a contiguous range found
+    by binary search, and every term points to the IDs of its owners.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._terms: list[str] = []
+        self._ids_by_term: dict[str, set[int]] = {}
+        self._entries: dict[int, Entry] = {}
+        # Entries put (the new entry) or removed (None) while the index is rebuilt, or None if it isn't.
+        self._changes_during_rebuild: dict[int, Entry | None] | None = None
+
+        metrics.register_gauge(f"{name}.size", lambda: len(self._entries))
+        metrics.register_gauge(f"{name}.terms", lambda: len(self._ids_by_term))
+        metrics.register_gauge(f"{name}.removed_terms", lambda: len(self._terms) - len(self._ids_by_term))
+
+    @staticmethod
+    def _entry_terms(entry: Entry) -> set[str]:
+        terms = (normalize_name(value) for value in entry[1:] if value)
+        return {term for term in terms if term}
+
+    @classmethod
+    def _build(cls, entries: Iterable[Entry]) -> Tuple[list[str], dict[str, set[int]], dict[int, Entry]]:
+        ids_by_term: dict[str, set[int]] = {}
+        entries_by_id: dict[int, Entry] = {}
+        for entry in entries:
+            entries_by_id[entry[0]] = entry
+            for term in cls._entry_terms(entry):
+                ids_by_term.setdefault(term, set()).add(entry[0])
+
+        terms = list(ids_by_term)
+        chunks = [sorted(terms[start:start + SORT_CHUNK_SIZE]) for start in range(0, len(terms), SORT_CHUNK_SIZE)]
+
+        return list(heapq.merge(*chunks)), ids_by_term, entries_by_id
+
+    async def rebuild(self, load_entries: Callable[[], Awaitable[list[Entry]]]) -> None:
+        """
+        This method is used to replace the whole content of the index with the loaded entries. The new content is
+        built in a separate thread, so the event loop isn't blocked by normalizing and sorting the terms, and on the
+        loop the old content is only swapped with the new one. Entries put or removed since the loading started are
+        applied to the new content again, so changes committed during the rebuild aren't lost.
+        """
+
+        self._changes_during_rebuild = {}
+        try:
+            entries = await load_entries()
+            content = await asyncio.to_thread(self._build, entries)
+            changes = self._changes_during_rebuild
+        finally:
+            self._changes_during_rebuild = None
+
+        self._terms, self._ids_by_term, self._entries = content
+        self.remove_many([entry_id for entry_id, entry in changes.items() if entry is None])
+        for entry in changes.values():
+            if entry is not None:
+                self.put(entry)
+
+    def put(self, entry: Entry) -> None:
+        """
+        This method is used to add a new entry or to replace the existing one with the same ID.
+        """
+
+        self.remove(entry[0])
+        if self._changes_during_rebuild is not None:
+            self._changes_during_rebuild[entry[0]] = entry
+
+        self._entries[entry[0]] = entry
+        for term in self._entry_terms(entry):
+            ids = self._ids_by_term.get(term)
+            if ids is None:
+                ids = self._ids_by_term[term] = set()
+                position = bisect.bisect_left(self._terms, term)
+                # The term may be still in the array, if it was removed before.
+                if position == len(self._terms) or self._terms[position] != term:
+                    self._terms.insert(position, term)
+            ids.add(entry[0])
+
+    def remove(self, entry_id: int) -> None:
+        self.remove_many([entry_id])
+
+    def remove_many(self, entry_ids: Iterable[int]) -> None:
+        """
+        This method is used to remove entries with given IDs. Terms left without owners stay in the sorted array
+        (every deletion would shift the rest of it) and are skipped by 'suggest'. They are dropped by the next rebuild,
+        or by filtering the array once they outnumber the remaining terms.
+        """
+
+        for entry_id in entry_ids:
+            if self._changes_during_rebuild is not None:
+                self._changes_during_rebuild[entry_id] = None
+
+            entry = self._entries.pop(entry_id, None)
+            if entry is None:
+                continue
+
+            for term in self._entry_terms(entry):
+                ids = self._ids_by_term.get(term)
+                if ids is None:
+                    continue
+
+                ids.discard(entry_id)
+                if not ids:
+                    del self._ids_by_term[term]
+
+        if len(self._terms) > 2 * len(self._ids_by_term):
+            self._terms = [term for term in self._terms if term in self._ids_by_term]
+
+    def suggest(self, query: str, limit: int = 10) -> list[Entry]:
+        """
+        This method is used to find entries, which have a term starting with every word of the query.
+        Candidates are taken from the range of the longest word, and checked against the other words.
+
+        Returns:
+            up to 'limit' entries ordered by the matched term (list[Entry])
+        """
+
+        words = normalize_name(query).split()
+        if not words:
+            return []
+
+        probe = max(words, key=len)
+        suggestions: list[Entry] = []
+        seen: set[int] = set()
+
+        for position in range(bisect.bisect_left(self._terms, probe), len(self._terms)):
+            term = self._terms[position]
+            if not term.startswith(probe):
+                break
+
+            for entry_id in sorted(self._ids_by_term.get(term, ())):
+                if entry_id in seen:
+                    continue
+                seen.add(entry_id)
+
+                entry = self._entries[entry_id]
+                entry_terms = self._entry_terms(entry)
+                if all(any(entry_term.startswith(word) for entry_term in entry_terms) for word in words):
+                    suggestions.append(entry)
+                    if len(suggestions) >= limit:
+                        return suggestions
+
+        return suggestions
+
+
+patient_autocomplete = PrefixIndex("autocomplete.patients")
+doctor_autocomplete = PrefixIndex("autocomplete.doctors")
+
+
+def to_entry(person: Patient | Doctor) -> Entry:
+    return person.id, person.first_name, person.last_name, person.middle_name, person.IIN
+
+
+async def load_autocomplete_index(index: PrefixIndex, model: Type[Patient] | Type[Doctor]) -> None:
+    """
+    This method is used to rebuild the index from the DB, reading only the indexed columns in batches.
+    """
+
+    query = select(model.id, model.first_name, model.last_name, model.middle_name, model.IIN). \
+        execution_options(yield_per=10000)
+
+    async def load_entries() -> list[Entry]:
+        async with async_session_maker() as session:
+            result = await session.stream(query)
+            return [tuple(row) async for row in result]
+
+    await index.rebuild(load_entries)
+
+
+async def load_autocomplete_indexes() -> None:
+    await load_autocomplete_index(patient_autocomplete, Patient)
+    await load_autocomplete_index(doctor_autocomplete, Doctor)
+
+
+async def refresh_autocomplete_indexes() -> None:
+    """
+    This method is used to periodically rebuild the indexes from the DB. Every worker keeps its own indexes
+    and updates them on its own writes, so changes made by other workers appear after the next rebuild.
+    """
+
+    while True:
+        await asyncio.sleep(AUTOCOMPLETE_REFRESH_INTERVAL_SECONDS)
+
+        try:
+            await load_autocomplete_indexes()
+        except Exception:
+            # The DB may be temporarily unavailable, the indexes will be rebuilt on the next run.
+            metrics.increment("autocomplete.refresh_failed")
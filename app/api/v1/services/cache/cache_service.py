@@ -0,0 +1,96 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Tuple
+
+from app.api.v1.services.metrics.metrics_service import metrics
+
+
+class TTLCache:
+    """
+    This class is used to keep a bounded number of values in memory. Every entry has its own expiration time
+    (UNIX timestamp), and when the cache is full, the least recently used entry is evicted.
+    Hits and misses are reported to metrics as '<name>.hits' and '<name>.misses' counters and '<name>.hit_rate' gauge.
+    """
+
+    def __init__(self, name: str, max_size: int, ttl: float | None = None) -> None:
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, Tuple[float | None, Any]] = OrderedDict()
+        # UNIX timestamp of the last invalidation.
+        self.invalidated_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+        metrics.register_gauge(f"{name}.size", lambda: len(self._entries))
+        metrics.register_gauge(f"{name}.hit_rate", lambda: self.hit_rate)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        This method is used to retrieve a value by the given key, if it is present and not expired.
+
+        Returns:
+            cached value or default (Any)
+        """
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at is None or time.time() < expires_at:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.increment(f"{self.name}.hits")
+                return value
+
+            del self._entries[key]
+
+        self.misses += 1
+        metrics.increment(f"{self.name}.misses")
+        return default
+
+    def set(self, key: Hashable, value: Any, expires_at: float | None = None) -> None:
+        """
+        This method is used to store the value by the given key. If 'expires_at' isn't given, the entry
+        expires after the cache TTL (or never, if the cache has no TTL).
+        """
+
+        if self.max_size <= 0:
+            return
+
+        if expires_at is None and self.ttl is not None:
+            expires_at = time.time() + self.ttl
+
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def set_if_not_invalidated_since(self, key: Hashable, value: Any, since: float) -> None:
+        """
+        This method is used to store the value derived from data read at the given time (UNIX timestamp), unless
+        the cache has been invalidated since then, so the value may miss the change, which invalidated the cache.
+        """
+
+        if since > self.invalidated_at:
+            self.set(key, value)
+
+    def invalidate(self, key: Hashable | None = None) -> None:
+        """
+        This method is used to remove the entry with given key, or all entries if the key isn't given.
+        """
+
+        self.invalidated_at = time.time()
+
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,27 +1,26 @@
 from typing import Any, Sequence, Tuple
 
 from fastapi import HTTPException
-from jose import JWTError
-from passlib.context import CryptContext
 from sqlalchemy.exc import IntegrityError
 
-from app.api.v1.auth.auth import verify_token
+from app.api.v1.auth.auth import forbid_roles, forget_unknown_user
+from app.api.v1.auth.jwt.token_schema import Principal
+from app.api.v1.auth.password import hash_password
 from app.api.v1.repositories.doctor_repository import DoctorRepository
+from app.api.v1.repositories.writes import is_unique_violation
+from app.api.v1.services.autocomplete.autocomplete_service import doctor_autocomplete
+from app.api.v1.services.pagination.pagination_service import Pagination, parse_fields
+from app.config.env_config import AUTOCOMPLETE_MAX_LIMIT, BULK_DELETE_MAX_IDS
 from app.schemas.schemas import DoctorRead, DoctorCreateRawPassword, DoctorCreateHashedPassword, \
-    DoctorUpdateRawPassword, DoctorUpdateHashedPassword, PatientRead, DoctorReadFullName
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-
-def hash_password(password: str):
-    return pwd_context.hash(password)
+    DoctorUpdateRawPassword, DoctorUpdateHashedPassword, PatientRead, DoctorReadFullName, PATIENT_LIST_FIELDS, \
+    AutocompleteItem, DoctorPatch, BulkDeleteRequest
 
 
 class DoctorService:
     def __init__(self, doctor_repository: DoctorRepository) -> None:
         self.doctor_repository = doctor_repository
 
-    async def get_doctors_without_pagination(self, token: str) -> Sequence[DoctorRead]:
+    async def get_doctors_without_pagination(self, principal: Principal) -> Sequence[DoctorRead]:
         """
         This method is used to retrieve all doctors from the DB without pagination.
 
@@ -29,16 +28,11 @@ class DoctorService:
             doctors (Sequence[DoctorRead])
         """
 
-        try:
-            user_role = verify_token(token)
-            if user_role["user_role"] in ["Patient"]:
-                raise HTTPException(status_code=403, detail="Forbidden: Unauthorized role")
-        except JWTError:
-            raise HTTPException(status_code=401, detail="Invalid token")
+        forbid_roles(principal, ["Patient"])
 
         return await self.doctor_repository.get_doctors_without_pagination()
 
-    async def get_doctors(self, token: str, offset: int = 0, page_size: int = 10) -> Tuple[int, Sequence[DoctorRead]]:
+    async def get_doctors(self, principal: Principal, pagination: Pagination) -> Tuple[int, Sequence[DoctorRead]]:
         """
         This method is used to retrieve all doctors from the DB.
 
@@ -47,17 +41,12 @@ class DoctorService:
             doctors (Sequence[DoctorRead])
         """
 
-        try:
-            user_role = verify_token(token)
-            if user_role["user_role"] in ["Patient"]:
-                raise HTTPException(status_code=403, detail="Forbidden: Unauthorized role")
-        except JWTError:
-            raise HTTPException(status_code=401, detail="Invalid token")
+        forbid_roles(principal, ["Patient"])
 
-        total, patients = await self.doctor_repository.get_doctors(offset=offset, limit=page_size)
+        total, patients = await self.doctor_repository.get_doctors(pagination)
         return total, patients
 
-    async def get_doctor_by_id(self, doctor_id: int, token: str) -> DoctorRead:
+    async def get_doctor_by_id(self, doctor_id: int, principal: Principal) -> DoctorRead:
         """
         This method is used to retrieve a certain doctor from the DB by his 'id' field.
 
@@ -68,12 +57,7 @@ class DoctorService:
             HTTPException (404): if the doctor with given ID does not exist.
         """
 
-        try:
-            user_role = verify_token(token)
-            if user_role["user_role"] in ["Patient"]:
-                raise HTTPException(status_code=403, detail="Forbidden: Unauthorized role")
-        except JWTError:
-            raise HTTPException(status_code=401, detail="Invalid token")
+        forbid_roles(principal, ["Patient"])
 
         doctor = await self.doctor_repository.get_doctor_by_id(doctor_id)
         if not doctor:
@@ -81,7 +65,36 @@ class DoctorService:
 
         return doctor
 
-    async def get_doctor_by_IIN(self, doctor_IIN: str, token: str) -> DoctorRead | None:
+    async def search_doctors(self, search_query: str, principal: Principal, pagination: Pagination) -> \
+            Tuple[int, Sequence[DoctorRead]]:
+        """
+        This method is used to search and retrieve doctors from the DB
+        by a search query (any combination of: (first_name, last_name, middle_name) or IIN).
+
+        Returns:
+            total (int)
+            doctors (Sequence[DoctorRead])
+        """
+
+        forbid_roles(principal, ["Patient"])
+
+        return await self.doctor_repository.search_doctors(search_query, pagination, principal.user_role)
+
+    async def autocomplete_doctors(self, query: str, principal: Principal, limit: int = 10) -> list[dict[str, Any]]:
+        """
+        This method is used to suggest doctors by the beginning of their names or IIN.
+        Suggestions are served from the in-memory index without querying the DB.
+
+        Returns:
+            suggested doctors (list[dict[str, Any]])
+        """
+
+        forbid_roles(principal, ["Patient"])
+
+        entries = doctor_autocomplete.suggest(query, min(limit, AUTOCOMPLETE_MAX_LIMIT))
+        return [dict(zip(AutocompleteItem.model_fields, entry)) for entry in entries]
+
+    async def get_doctor_by_IIN(self, doctor_IIN: str, principal: Principal) -> DoctorRead | None:
         """
         This method is used to retrieve a certain doctor from the DB by his 'IIN' field.
 
@@ -89,12 +102,7 @@ class DoctorService:
             doctor (PatientRead | None)
         """
 
-        try:
-            user_role = verify_token(token)
-            if user_role["user_role"] in ["Patient"]:
-                raise HTTPException(status_code=403, detail="Forbidden: Unauthorized role")
-        except JWTError:
-            raise HTTPException(status_code=401, detail="Invalid token")
+        forbid_roles(principal, ["Patient"])
 
         doctor = await self.doctor_repository.get_doctor_by_IIN(doctor_IIN)
 
@@ -103,7 +111,7 @@ class DoctorService:
 
         return doctor
 
-    async def get_doctor_full_name_by_id(self, doctor_id: int, token: str) -> DoctorReadFullName | None:
+    async def get_doctor_full_name_by_id(self, doctor_id: int, principal: Principal) -> DoctorReadFullName | None:
         """
         This method is used to retrieve a certain doctor's full name from the DB by his 'id' field.
 
@@ -112,14 +120,8 @@ class DoctorService:
 
         Raises:
             HTTPException (404): if the doctor with given ID does not exist.
-            HTTPException (401): if the token is invalid.
         """
 
-        try:
-            verify_token(token)
-        except JWTError:
-            raise HTTPException(status_code=401, detail="Invalid token")
-
         doctor = await self.doctor_repository.get_doctor_by_id(doctor_id)
         if not doctor:
             raise HTTPException(status_code=404, detail=f"Doctor with id {doctor_id} doest not exist.")
@@ -133,42 +135,48 @@ class DoctorService:
 
         return doctor_initials
 
-    async def get_doctor_patients(self, doctor_IIN: str, token: str, offset: int = 0, limit: int = 10) -> \
-            Tuple[int, Sequence[PatientRead]]:
+    async def get_doctor_patients(self, doctor_IIN: str, principal: Principal, pagination: Pagination,
+                                  fields: str | None = None) -> Tuple[int, Sequence[dict[str, Any]]]:
         """
         Retrieve list of doctor's patients, assigned to the doctor with this IIN.
 
         Arguments:
             doctor_IIN (str): Doctor's Individual Identification Number
-            token (str): User's authentication token
+            principal (Principal): Authenticated user
+            fields (str | None): Comma-separated patient fields to load (PATIENT_LIST_FIELDS by default)
 
         Returns:
             total (int)
-            Sequence[PatientRead]: List of patients (details may be limited due to privacy)
+            Sequence[dict[str, Any]]: List of patients (details may be limited due to privacy)
+
+        Raises:
+            HTTPException (400): If an unknown field is requested.
         """
 
-        try:
-            user_role = verify_token(token)
-            if user_role["user_role"] in ["Patient"]:
-                raise HTTPException(status_code=403, detail="Forbidden: Unauthorized role")
-        except JWTError:
-            raise HTTPException(status_code=401, detail="Invalid token")
-
-        existing_doctor = await self.get_doctor_by_IIN(doctor_IIN, token)
-        if not existing_doctor:
-            raise HTTPException(status_code=404, detail=f"Doctor with IIN {doctor_IIN} does not exist.")
+        forbid_roles(principal, ["Patient"])
+        columns = parse_fields(fields, PatientRead.model_fields, PATIENT_LIST_FIELDS)
+
+        # A doctor requesting their own patients is scoped by the ID from the token, without a lookup by IIN.
+        if principal.user_role == "Doctor" and principal.subject == doctor_IIN and principal.user_id is not None:
+            doctor_id = principal.user_id
+        else:
+            doctor_id = await self.doctor_repository.get_doctor_id_by_IIN(doctor_IIN)
+            if doctor_id is None:
+                raise HTTPException(status_code=404, detail=f"Doctor with IIN {doctor_IIN} does not exist.")
 
-        total, doctor_patients = await self.doctor_repository.get_doctor_patients(existing_doctor.id, offset, limit)
+        total, doctor_patients = await self.doctor_repository.get_doctor_patients(doctor_id, pagination, columns)
         return total, doctor_patients
 
-    async def create_doctor(self, raw_doctor_data: DoctorCreateRawPassword, token: str) -> dict[str, Any]:
+    async def create_doctor(self, raw_doctor_data: DoctorCreateRawPassword, principal: Principal) -> dict[str, Any]:
         """
         This method is used to create a doctor with the given data ('DoctorCreateRawPassword' model).
         Moreover, this method:
         1). Hashes the raw password by creating new DICT with added 'hashed_password' field and
         deleted 'password' field. After this, it creates a new 'DoctorCreateHashedPassword' object and sends it
         to the 'doctor_repository'.
-        2). Checking if doctor with given IIN already exists in the DB.
+        2). Maps a duplicate IIN, detected by the INSERT itself, to 409.
+        The IIN is looked up first, so a duplicate is rejected before the bcrypt hash, at the cost of a round trip
+        per created doctor (as in 'PatientService.create_patient').
 
         Returns:
             created doctor data (dict[str, Any])
@@ -177,19 +185,12 @@ class DoctorService:
             HTTPException (409): if doctor with given IIN already exists in the DB.
         """
 
-        try:
-            user_role = verify_token(token)
-            if user_role["user_role"] in ["Patient", "Doctor"]:
-                raise HTTPException(status_code=403, detail="Forbidden: Unauthorized role")
-        except JWTError:
-            raise HTTPException(status_code=401, detail="Invalid token")
-
-        # Checking if doctor with provided IIN already exists in the DB.
-        already_existing_doctor_with_provided_IIN = await self.doctor_repository.get_doctor_by_IIN(raw_doctor_data.IIN)
-        if already_existing_doctor_with_provided_IIN:
+        forbid_roles(principal, ["Patient", "Doctor"])
+
+        if await self.doctor_repository.get_doctor_id_by_IIN(raw_doctor_data.IIN) is not None:
             raise HTTPException(status_code=409, detail=f"Doctor with IIN {raw_doctor_data.IIN} already exists.")
 
-        hashed_password = hash_password(raw_doctor_data.password)
+        hashed_password = await hash_password(raw_doctor_data.password)
 
         doctor_data = raw_doctor_data.model_dump()
         doctor_data["hashed_password"] = hashed_password
@@ -197,9 +198,15 @@ class DoctorService:
 
         doctor_with_hashed_password = DoctorCreateHashedPassword(**doctor_data)
 
-        return await self.doctor_repository.create_doctor(doctor_with_hashed_password)
+        new_doctor = await self.doctor_repository.create_doctor(doctor_with_hashed_password)
+        if new_doctor is None:
+            raise HTTPException(status_code=409, detail=f"Doctor with IIN {raw_doctor_data.IIN} already exists.")
+
+        forget_unknown_user(self.doctor_repository.session, "Doctor", raw_doctor_data.IIN)
 
-    async def update_doctor(self, new_data_for_doctor: DoctorUpdateRawPassword, doctor_id: int, token: str) -> DoctorRead:
+        return new_doctor
+
+    async def update_doctor(self, new_data_for_doctor: DoctorUpdateRawPassword, doctor_id: int, principal: Principal) -> DoctorRead:
         """
         This method is used to update the existing doctor data with the new one ('DoctorUpdateRawPassword' model).
 
@@ -207,18 +214,13 @@ class DoctorService:
             updated doctor (DoctorRead)
         """
 
-        try:
-            user_role = verify_token(token)
-            if user_role["user_role"] in ["Patient"]:
-                raise HTTPException(status_code=403, detail="Forbidden: Unauthorized role")
-        except JWTError:
-            raise HTTPException(status_code=401, detail="Invalid token")
+        forbid_roles(principal, ["Patient"])
 
         doctor_to_update = await self.doctor_repository.get_doctor_by_id(doctor_id)
         if doctor_to_update is None:
             raise HTTPException(status_code=404, detail=f"Patient with id {doctor_id} does not exist.")
 
-        hashed_password = hash_password(new_data_for_doctor.password)
+        hashed_password = await hash_password(new_data_for_doctor.password)
 
         doctor_data = new_data_for_doctor.model_dump()
         doctor_data["hashed_password"] = hashed_password
@@ -226,9 +228,50 @@ class DoctorService:
 
         doctor_with_hashed_password = DoctorUpdateHashedPassword(**doctor_data)
 
-        return await self.doctor_repository.update_doctor(doctor_with_hashed_password, doctor_id)
+        updated_doctor = await self.doctor_repository.update_doctor(doctor_with_hashed_password, doctor_id)
+        forget_unknown_user(self.doctor_repository.session, "Doctor", new_data_for_doctor.IIN)
 
-    async def delete_doctor(self, doctor_id: int, token: str) -> dict:
+        return updated_doctor
+
+    async def patch_doctor(self, doctor_id: int, principal: Principal, patch: DoctorPatch) -> dict[str, Any]:
+        """
+        This method is used to update only the given fields of the existing doctor ('DoctorPatch' model).
+        The password is hashed only if it's given.
+
+        Returns:
+            ID and the updated fields of the doctor (dict[str, Any])
+
+        Raises:
+            HTTPException (400): If no fields are given.
+            HTTPException (404): If the doctor with given ID does not exist.
+            HTTPException (409): If a doctor with given IIN already exists.
+        """
+
+        forbid_roles(principal, ["Patient"])
+
+        values = patch.model_dump(exclude_unset=True)
+        if not values:
+            raise HTTPException(status_code=400, detail="No fields to update.")
+
+        if "password" in values:
+            values["hashed_password"] = await hash_password(values.pop("password"))
+
+        try:
+            doctor = await self.doctor_repository.patch_doctor(doctor_id, values)
+        except IntegrityError as error:
+            if is_unique_violation(error):
+                raise HTTPException(status_code=409, detail=f"Doctor with IIN {values['IIN']} already exists.")
+            raise
+
+        if doctor is None:
+            raise HTTPException(status_code=404, detail=f"Doctor with id {doctor_id} does not exist.")
+
+        if "IIN" in values:
+            forget_unknown_user(self.doctor_repository.session, "Doctor", values["IIN"])
+
+        return {key: doctor[key] for key in ["id", *values] if key in doctor}
+
+    async def delete_doctor(self, doctor_id: int, principal: Principal) -> dict:
         """
         This method is used to delete the existing doctor with given id.
 
@@ -241,21 +284,45 @@ class DoctorService:
             existing patients.
         """
 
-        try:
-            user_role = verify_token(token)
-            if user_role["user_role"] in ["Patient"]:
-                raise HTTPException(status_code=403, detail="Forbidden: Unauthorized role")
-        except JWTError:
-            raise HTTPException(status_code=401, detail="Invalid token")
-
-        doctor_to_delete = await self.doctor_repository.get_doctor_by_id(doctor_id)
-        if doctor_to_delete is None:
-            raise HTTPException(status_code=404, detail=f"Doctor with id {doctor_id} does not exist.")
+        forbid_roles(principal, ["Patient"])
 
         try:
-            await self.doctor_repository.delete_doctor(doctor_id)
-            return {"doctor_id": doctor_id, "message": f"Doctor with id {doctor_id} has been deleted."}
+            deleted_doctor_id = await self.doctor_repository.delete_doctor(doctor_id)
         except IntegrityError:
             raise HTTPException(status_code=409,
                                 detail=f"Doctor with id {doctor_id} cannot be deleted because they have associated "
                                        f"patients.")
+
+        if deleted_doctor_id is None:
+            raise HTTPException(status_code=404, detail=f"Doctor with id {doctor_id} does not exist.")
+
+        return {"doctor_id": doctor_id, "message": f"Doctor with id {doctor_id} has been deleted."}
+
+    async def delete_doctors(self, request: BulkDeleteRequest, principal: Principal) -> dict[str, list[int]]:
+        """
+        This method is used to delete the existing doctors with given IDs by a single statement (for admins only).
+        Either all the existing doctors are deleted, or none of them if any has patients.
+
+        Returns:
+            IDs of the deleted doctors and IDs, which don't exist (dict[str, list[int]])
+
+        Raises:
+            HTTPException (400): If more than BULK_DELETE_MAX_IDS IDs are given.
+            HTTPException (409): If any of the doctors has patients.
+        """
+
+        forbid_roles(principal, ["Patient", "Doctor"])
+
+        doctor_ids = sorted(set(request.ids))
+        if len(doctor_ids) > BULK_DELETE_MAX_IDS:
+            raise HTTPException(status_code=400,
+                                detail=f"At most {BULK_DELETE_MAX_IDS} doctors can be deleted at once.")
+
+        try:
+            deleted_ids = set(await self.doctor_repository.delete_doctors(doctor_ids))
+        except IntegrityError:
+            raise HTTPException(status_code=409,
+                                detail="Doctors cannot be deleted because some of them have associated patients.")
+
+        return {"deleted_ids": sorted(deleted_ids),
+                "not_found_ids": [doctor_id for doctor_id in doctor_ids if doctor_id not in deleted_ids]}
@@ -0,0 +1,79 @@
+from collections import defaultdict, deque
+from typing import Any, Callable, Deque, Dict
+
+
+class Metrics:
+    """
+    This class is used to collect in-process metrics (counters, gauges and timings) of the application.
+    Values are kept per worker process and exposed via the '/api/v1/metrics' endpoint.
+    """
+
+    def __init__(self, timings_window: int = 1024) -> None:
+        self._counters: Dict[str, int] = defaultdict(int)
+        self._gauges: Dict[str, Callable[[], Any]] = {}
+        self._timings: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=timings_window))
+        self._timings_count: Dict[str, int] = defaultdict(int)
+
+    def increment(self, name: str, value: int = 1) -> None:
+        """
+        This method is used to increment the counter with given name.
+        """
+
+        self._counters[name] += value
+
+    def register_gauge(self, name: str, callback: Callable[[], Any]) -> None:
+        """
+        This method is used to register a gauge, which value is computed by the given callback on every snapshot.
+        """
+
+        self._gauges[name] = callback
+
+    def set_gauge(self, name: str, value: Any) -> None:
+        """
+        This method is used to set a static value of the gauge with given name.
+        """
+
+        self._gauges[name] = lambda: value
+
+    def observe(self, name: str, seconds: float) -> None:
+        """
+        This method is used to record a duration (in seconds) for the timing with given name.
+        """
+
+        self._timings[name].append(seconds)
+        self._timings_count[name] += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        """
+        This method is used to retrieve current values of all metrics.
+
+        Returns:
+            metrics (dict[str, Any])
+        """
+
+        timings = {}
+        for name, values in self._timings.items():
+            ordered = sorted(values)
+            timings[name] = {
+                "count": self._timings_count[name],
+                "p50_ms": _percentile(ordered, 0.50) * 1000,
+                "p99_ms": _percentile(ordered, 0.99) * 1000,
+                "max_ms": (ordered[-1] if ordered else 0.0) * 1000,
+            }
+
+        return {
+            "counters": dict(self._counters),
+            "gauges": {name: callback() for name, callback in self._gauges.items()},
+            "timings": timings,
+        }
+
+
+def _percentile(ordered: list[float], fraction: float) -> float:
+    if not ordered:
+        return 0.0
+
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+metrics = Metrics()
@@ -1,29 +1,158 @@
-from typing import List, Any
+import base64
+import binascii
+import json
+import math
+from typing import List, Any, Sequence, Iterable
+
+from fastapi import HTTPException
+
+
+def encode_cursor(key: Sequence[Any], direction: str) -> str:
+    """
+    This method is used to build an opaque cursor from the sort key of a row and the direction of paging.
+
+    Returns:
+        cursor (str)
+    """
+
+    return base64.urlsafe_b64encode(json.dumps({"key": list(key), "direction": direction}).encode()).decode()
+
+
+def is_number(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) or isinstance(value, float) and math.isfinite(value)
+
+
+def decode_cursor(cursor: str) -> tuple[list[Any], str]:
+    """
+    This method is used to read the sort key and the direction of paging from the cursor. All sort keys of lists
+    are numeric (IDs and similarities), so values of other types (including 'true'/'false', NaN and infinities)
+    are rejected here instead of failing in the DB or in the cached ranking.
+
+    Returns:
+        sort key and direction ('next' or 'prev') (tuple[list[Any], str])
+
+    Raises:
+        HTTPException (400): If the cursor is malformed.
+    """
+
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        key, direction = data["key"], data["direction"]
+    except (ValueError, binascii.Error, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+    if direction not in ["next", "prev"] or not isinstance(key, list) or not all(is_number(value) for value in key):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+    return key, direction
+
+
+def parse_fields(fields: str | None, allowed: Iterable[str], default: Sequence[str]) -> list[str]:
+    """
+    This method is used to read the sparse fieldset ('fields' parameter, e.g. 'id,IIN,age') of a list.
+    The 'id' field is always included.
+
+    Returns:
+        requested fields or the default ones (list[str])
+
+    Raises:
+        HTTPException (400): If an unknown field is requested.
+    """
+
+    if not fields:
+        return list(default)
+
+    requested = ["id"] + [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}.")
+
+    return list(dict.fromkeys(requested))
 
 
 class Pagination:
-    def __init__(self, page: int = 1, page_size: int = 10):
+    """
+    This class is used to paginate lists either by page number ('OFFSET') or by cursor (keyset pagination).
+    In cursor mode the page is read right after (or before) the sort key stored in the cursor, so deep pages
+    cost the same as the first one. Every page contains cursors of its neighbours, so a client can switch
+    to cursor mode from any page.
+    The total is computed with the given strategy (see TOTAL_STRATEGIES in the environment config), which is
+    reported in the result.
+    """
+
+    def __init__(self, page: int = 1, page_size: int = 10, cursor: str | None = None, total_strategy: str = "exact"):
         self.page = page
         self.page_size = page_size
+        self.total_strategy = total_strategy
+        self.cursor_key, self.cursor_direction = decode_cursor(cursor) if cursor else (None, "next")
+
+        # Filled in by the repository with the sort keys of the first and last rows of the page.
+        self.first_key: Sequence[Any] | None = None
+        self.last_key: Sequence[Any] | None = None
+        self.has_more = False
 
     @property
     def offset(self):
+        if self.cursor_key is not None:
+            return 0
+
         return (self.page - 1) * self.page_size
 
-    def paginate(self, total: int, data: List[Any]) -> dict[str, int | list[Any]]:
+    def set_page_keys(self, first_key: Sequence[Any] | None, last_key: Sequence[Any] | None, has_more: bool) -> None:
+        """
+        This method is used to remember sort keys of the first and last rows of the page and if there are more rows
+        in the direction of paging, so the cursors of the neighbour pages can be built.
+        """
+
+        self.first_key = first_key
+        self.last_key = last_key
+        self.has_more = has_more
+
+    def cursors(self) -> tuple[str | None, str | None]:
+        """
+        This method is used to build cursors of the next and previous pages.
+
+        Returns:
+            next and previous cursors (tuple[str | None, str | None])
+        """
+
+        if self.first_key is None:
+            return None, None
+
+        if self.cursor_key is None:
+            has_next, has_prev = self.has_more, self.offset > 0
+        elif self.cursor_direction == "next":
+            has_next, has_prev = self.has_more, True
+        else:
+            has_next, has_prev = True, self.has_more
+
+        next_cursor = encode_cursor(self.last_key, "next") if has_next else None
+        prev_cursor = encode_cursor(self.first_key, "prev") if has_prev else None
+
+        return next_cursor, prev_cursor
+
+    def paginate(self, total: int, data: List[Any]) -> dict[str, int | str | None | list[Any]]:
         if not data:
             return {
                 "page": self.page,
                 "page_size": self.page_size,
                 "total": 0,
                 "total_pages": 1,
+                "total_strategy": self.total_strategy,
                 "data": [],
+                "next_cursor": None,
+                "prev_cursor": None,
             }
 
+        next_cursor, prev_cursor = self.cursors()
+
         return {
             "page": self.page,
             "page_size": self.page_size,
             "total": total,
             "total_pages": total // self.page_size if total % self.page_size == 0 else total // self.page_size + 1,
+            "total_strategy": self.total_strategy,
             "data": data,
+            "next_cursor": next_cursor,
+            "prev_cursor": prev_cursor,
         }
@@ -1,21 +1,20 @@
 from typing import Any, Sequence, Tuple
 
 from fastapi import HTTPException
-from jose import JWTError
-from passlib.context import CryptContext
+from sqlalchemy.exc import IntegrityError
 
-from app.api.v1.auth.auth import verify_token
+from app.api.v1.auth.auth import forbid_roles, forget_unknown_user
+from app.api.v1.auth.jwt.token_schema import Principal
+from app.api.v1.auth.password import hash_password
 from app.api.v1.repositories.patient_repository import PatientRepository
+from app.api.v1.repositories.writes import is_foreign_key_violation, is_unique_violation
+from app.api.v1.services.autocomplete.autocomplete_service import patient_autocomplete
 from app.api.v1.services.doctor_service import DoctorService
-from app.models.models import Patient
+from app.api.v1.services.pagination.pagination_service import Pagination, parse_fields
+from app.config.env_config import AUTOCOMPLETE_MAX_LIMIT, BULK_DELETE_MAX_IDS
 from app.schemas.schemas import PatientRead, PatientCreateRawPassword, PatientCreateHashedPassword, \
-    PatientUpdateRawPassword, PatientUpdateHashedPassword
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-
-def hash_password(password: str):
-    return pwd_context.hash(password)
+    PatientUpdateRawPassword, PatientUpdateHashedPassword, PATIENT_LIST_FIELDS, AutocompleteItem, PatientPatch, \
+    BulkDeleteRequest
 
 
 class PatientService:
@@ -23,23 +22,25 @@ class PatientService:
         self.patient_repository = patient_repository
         self.doctor_service = doctor_service
 
-    async def get_patients(self, token: str, offset: int = 0, page_size: int = 10) -> tuple[Any | None, Sequence[Patient]]:
+    async def get_patients(self, principal: Principal, pagination: Pagination, fields: str | None = None) -> \
+            tuple[Any | None, Sequence[dict[str, Any]]]:
         """
-        This method is used to retrieve all patients from the DB.
+        This method is used to retrieve all patients from the DB. Only the requested fields (comma-separated)
+        are loaded, or PATIENT_LIST_FIELDS when 'fields' isn't given.
 
         Returns:
             total (int)
-            patients (Sequence[Patient])
+            patients (Sequence[dict[str, Any]])
+
+        Raises:
+            HTTPException (400): If an unknown field is requested.
         """
-        try:
-            verify_token(token)
-        except JWTError:
-            raise HTTPException(status_code=401, detail="Invalid token")
 
-        total, patients = await self.patient_repository.get_patients(offset=offset, limit=page_size)
+        columns = parse_fields(fields, PatientRead.model_fields, PATIENT_LIST_FIELDS)
+        total, patients = await self.patient_repository.get_patients(pagination, columns)
         return total, patients
 
-    async def get_patient_by_id(self, patient_id: int, token: str) -> PatientRead | None:
+    async def get_patient_by_id(self, patient_id: int, principal: Principal) -> PatientRead | None:
         """
         This method is used to retrieve a certain patient from the DB by his 'id' field.
 
@@ -47,18 +48,13 @@ class PatientService:
             patient (PatientRead | None)
         """
 
-        try:
-            verify_token(token)
-        except JWTError:
-            raise HTTPException(status_code=401, detail="Invalid token")
-
         patient = await self.patient_repository.get_patient_by_id(patient_id)
         if not patient:
             raise HTTPException(status_code=404, detail=f"Patient with id {patient_id} does not exist.")
 
         return patient
 
-    async def get_patient_by_IIN(self, patient_IIN: str, token: str) -> PatientRead | None:
+    async def get_patient_by_IIN(self, patient_IIN: str, principal: Principal) -> PatientRead | None:
         """
         This method is used to retrieve a certain patient from the DB by his 'IIN' field.
 
@@ -66,50 +62,73 @@ class PatientService:
             patient (PatientRead | None)
         """
 
-        try:
-            verify_token(token)
-        except JWTError:
-            raise HTTPException(status_code=401, detail="Invalid token")
-
         patient = await self.patient_repository.get_patient_by_IIN(patient_IIN)
         if not patient:
             raise HTTPException(status_code=404, detail=f"Patient with IIN {patient_IIN} does not exist.")
 
         return patient
 
-    async def create_patient(self, token: str, raw_patient_data: PatientCreateRawPassword) -> dict[str, Any]:
+    async def search_patients(self, search_query: str, principal: Principal, pagination: Pagination,
+                              fields: str | None = None) -> Tuple[int, Sequence[dict[str, Any]]]:
+        """
+        This method is used to search and retrieve patients from the DB
+        by a search query (any combination of: (first_name, last_name, middle_name) or IIN).
+        Only the requested fields (comma-separated) are loaded, or PATIENT_LIST_FIELDS when 'fields' isn't given.
+
+        Returns:
+            total (int)
+            patients (Sequence[dict[str, Any]])
+
+        Raises:
+            HTTPException (400): If an unknown field is requested.
+        """
+
+        forbid_roles(principal, ["Patient"])
+        columns = parse_fields(fields, PatientRead.model_fields, PATIENT_LIST_FIELDS)
+
+        return await self.patient_repository.search_patients(search_query, pagination, columns, principal.user_role)
+
+    async def autocomplete_patients(self, query: str, principal: Principal, limit: int = 10) -> list[dict[str, Any]]:
+        """
+        This method is used to suggest patients by the beginning of their names or IIN.
+        Suggestions are served from the in-memory index without querying the DB.
+
+        Returns:
+            suggested patients (list[dict[str, Any]])
+        """
+
+        forbid_roles(principal, ["Patient"])
+
+        entries = patient_autocomplete.suggest(query, min(limit, AUTOCOMPLETE_MAX_LIMIT))
+        return [dict(zip(AutocompleteItem.model_fields, entry)) for entry in entries]
+
+    async def create_patient(self, principal: Principal, raw_patient_data: PatientCreateRawPassword) -> dict[str, Any]:
         """
         This method is used to create a patient with the given data ('PatientCreateRawPassword' model).
         Moreover, this method:
         1). Hashes the raw password by creating new DICT with added 'hashed_password' field and
         deleted 'password' field. After this, it creates a new 'PatientCreateHashedPassword' object and sends it
         to the 'patient_repository'.
-        2). Checking if patient with given IIN already exists in the DB.
+        2). Maps a duplicate IIN and a missing doctor, both detected by the INSERT itself, to 409 and 404.
+        A duplicate IIN is also checked by a cheap lookup (by the unique index) before the password is hashed,
+        so repeated submissions are rejected without spending a bcrypt hash (and a slot of the password executor)
+        on them. It costs one more round trip for every created patient. The lookup can't see a concurrent create
+        with the same IIN, which is still rejected by the INSERT.
 
         Returns:
             created patient data (dict[str, Any])
 
         Raises:
             HTTPException (409): if patient with given IIN already exists in the DB.
+            HTTPException (404): if the doctor of the patient does not exist.
         """
 
-        try:
-            user_role = verify_token(token)
-            if user_role["user_role"] in ["Patient"]:
-                raise HTTPException(status_code=403, detail="Forbidden: Unauthorized role")
-        except JWTError:
-            raise HTTPException(status_code=401, detail="Invalid token")
-
-        # Checking if patient with provided IIN already exists in the DB.
-        already_existing_patient_with_provided_IIN = await self.patient_repository.get_patient_by_IIN(
-            raw_patient_data.IIN)
-        if already_existing_patient_with_provided_IIN:
-            raise HTTPException(status_code=409, detail=f"Patient with IIN {raw_patient_data.IIN} already exists.")
+        forbid_roles(principal, ["Patient"])
 
-        # Checking the presence of a patient's doctor in the DB
-        await self.doctor_service.get_doctor_by_id(raw_patient_data.doctor_id, token)
+        if await self.patient_repository.get_patient_id_by_IIN(raw_patient_data.IIN) is not None:
+            raise HTTPException(status_code=409, detail=f"Patient with IIN {raw_patient_data.IIN} already exists.")
 
-        hashed_password = hash_password(raw_patient_data.password)
+        hashed_password = await hash_password(raw_patient_data.password)
 
         patient_data = raw_patient_data.model_dump()
         patient_data["hashed_password"] = hashed_password
@@ -117,9 +136,22 @@ class PatientService:
 
         patient_with_hashed_password = PatientCreateHashedPassword(**patient_data)
 
-        return await self.patient_repository.create_patient(patient_with_hashed_password)
+        try:
+            new_patient = await self.patient_repository.create_patient(patient_with_hashed_password)
+        except IntegrityError as error:
+            if is_foreign_key_violation(error):
+                raise HTTPException(status_code=404,
+                                    detail=f"Doctor with id {raw_patient_data.doctor_id} does not exist.")
+            raise
+
+        if new_patient is None:
+            raise HTTPException(status_code=409, detail=f"Patient with IIN {raw_patient_data.IIN} already exists.")
+
+        forget_unknown_user(self.patient_repository.session, "Patient", raw_patient_data.IIN)
 
-    async def update_patient(self, patient_id: int, token: str,
+        return new_patient
+
+    async def update_patient(self, patient_id: int, principal: Principal,
                              new_data_for_patient: PatientUpdateRawPassword) -> PatientRead:
         """
         This method is used to update the existing patient data with the new one ('PatientUpdate' model).
@@ -128,19 +160,14 @@ class PatientService:
             updated patient (PatientRead)
         """
 
-        try:
-            user_role = verify_token(token)
-            if user_role["user_role"] in ["Patient"]:
-                raise HTTPException(status_code=403, detail="Forbidden: Unauthorized role")
-        except JWTError:
-            raise HTTPException(status_code=401, detail="Invalid token")
+        forbid_roles(principal, ["Patient"])
 
         patient_to_update = await self.patient_repository.get_patient_by_id(patient_id)
         if patient_to_update is None:
             raise HTTPException(status_code=404, detail=f"Patient with id {patient_id} does not exist.")
 
         if new_data_for_patient.password:
-            hashed_password = hash_password(new_data_for_patient.password)
+            hashed_password = await hash_password(new_data_for_patient.password)
         else:
             hashed_password = patient_to_update.hashed_password
 
@@ -150,9 +177,52 @@ class PatientService:
 
         patient_with_hashed_password = PatientUpdateHashedPassword(**patient_data)
 
-        return await self.patient_repository.update_patient(patient_id, patient_with_hashed_password)
+        updated_patient = await self.patient_repository.update_patient(patient_id, patient_with_hashed_password)
+        forget_unknown_user(self.patient_repository.session, "Patient", new_data_for_patient.IIN)
+
+        return updated_patient
+
+    async def patch_patient(self, patient_id: int, principal: Principal, patch: PatientPatch) -> dict[str, Any]:
+        """
+        This method is used to update only the given fields of the existing patient ('PatientPatch' model).
+        The password is hashed only if it's given.
+
+        Returns:
+            ID and the updated fields of the patient (dict[str, Any])
+
+        Raises:
+            HTTPException (400): If no fields are given.
+            HTTPException (404): If the patient with given ID or the given doctor does not exist.
+            HTTPException (409): If a patient with given IIN already exists.
+        """
+
+        forbid_roles(principal, ["Patient"])
+
+        values = patch.model_dump(exclude_unset=True)
+        if not values:
+            raise HTTPException(status_code=400, detail="No fields to update.")
+
+        if "password" in values:
+            values["hashed_password"] = await hash_password(values.pop("password"))
+
+        try:
+            patient = await self.patient_repository.patch_patient(patient_id, values)
+        except IntegrityError as error:
+            if is_foreign_key_violation(error):
+                raise HTTPException(status_code=404, detail=f"Doctor with id {values['doctor_id']} does not exist.")
+            if is_unique_violation(error):
+                raise HTTPException(status_code=409, detail=f"Patient with IIN {values['IIN']} already exists.")
+            raise
+
+        if patient is None:
+            raise HTTPException(status_code=404, detail=f"Patient with id {patient_id} does not exist.")
+
+        if "IIN" in values:
+            forget_unknown_user(self.patient_repository.session, "Patient", values["IIN"])
+
+        return {key: patient[key] for key in ["id", *values] if key in patient}
 
-    async def delete_patient(self, patient_id: int, token: str) -> dict:
+    async def delete_patient(self, patient_id: int, principal: Principal) -> dict:
         """
         This method is used to delete the existing patient with given id.
 
@@ -163,17 +233,33 @@ class PatientService:
             HTTPException (404): If the patient with given ID does not exist.
         """
 
-        try:
-            user_role = verify_token(token)
-            if user_role["user_role"] in ["Patient"]:
-                raise HTTPException(status_code=403, detail="Forbidden: Unauthorized role")
-        except JWTError:
-            raise HTTPException(status_code=401, detail="Invalid token")
-
-        patient_to_delete = await self.patient_repository.get_patient_by_id(patient_id)
-        if patient_to_delete is None:
-            raise HTTPException(status_code=404, detail=f"Patient with id {patient_id} does not exist.")
+        forbid_roles(principal, ["Patient"])
 
-        await self.patient_repository.delete_patient(patient_id)
+        deleted_patient_id = await self.patient_repository.delete_patient(patient_id)
+        if deleted_patient_id is None:
+            raise HTTPException(status_code=404, detail=f"Patient with id {patient_id} does not exist.")
 
         return {"patient_id": patient_id, "message": f"Patient with id {patient_id} has been deleted."}
+
+    async def delete_patients(self, request: BulkDeleteRequest, principal: Principal) -> dict[str, list[int]]:
+        """
+        This method is used to delete the existing patients with given IDs by a single statement (for admins only).
+
+        Returns:
+            IDs of the deleted patients and IDs, which don't exist (dict[str, list[int]])
+
+        Raises:
+            HTTPException (400): If more than BULK_DELETE_MAX_IDS IDs are given.
+        """
+
+        forbid_roles(principal, ["Patient", "Doctor"])
+
+        patient_ids = sorted(set(request.ids))
+        if len(patient_ids) > BULK_DELETE_MAX_IDS:
+            raise HTTPException(status_code=400,
+                                detail=f"At most {BULK_DELETE_MAX_IDS} patients can be deleted at once.")
+
+        deleted_ids = set(await self.patient_repository.delete_patients(patient_ids))
+
+        return {"deleted_ids": sorted(deleted_ids),
+                "not_found_ids": [patient_id for patient_id in patient_ids if patient_id not in deleted_ids]}
@@ -0,0 +1,217 @@
+"""
+This command is used to find repository queries, which read large tables sequentially, i.e. miss an index.
+It runs the read methods of the repositories (and the checks of foreign keys made by the DB on deleting or changing
+a referenced row), captures the executed statements, explains them with their parameters and reports sequential
+scans of tables with at least '--min-rows' rows. It runs against the DB from the environment config, and optionally
+fills it with copies of the first doctor and patient first, so the planner sees a realistic table size.
+
+Usage:
+    python -m app.commands.advise_indexes --seed-doctors 1000 --seed-patients 1000000 --min-rows 10000
+"""
+import argparse
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Iterator
+
+from fastapi import HTTPException
+from sqlalchemy import event, select, text, literal
+
+from app.api.v1.repositories.doctor_repository import DoctorRepository
+from app.api.v1.repositories.patient_repository import PatientRepository
+from app.api.v1.repositories.refresh_token_repository import RefreshTokenRepository
+from app.api.v1.repositories.search import patient_search_results, doctor_search_results
+from app.api.v1.services.pagination.pagination_service import Pagination
+from app.config.database import engine, async_session_maker
+from app.models.models import models_metadata, Patient, Doctor
+from app.schemas.schemas import PATIENT_LIST_FIELDS
+
+SEED_BATCH_SIZE = 50000
+
+# Deep enough, that the planner can't just read the beginning of any index in order.
+DEEP_PAGE = 1000
+
+
+async def seed(model: type[Patient] | type[Doctor], count: int) -> None:
+    """
+    This method is used to insert 'count' copies of the first row of the table with generated IINs.
+    Copies of the patient are assigned to all doctors evenly.
+    """
+
+    table = model.__tablename__
+    replaced = {"id", "IIN", "doctor_id"}
+    columns = [column.name for column in model.__table__.columns if column.name not in replaced]
+    column_list = ", ".join(f'"{column}"' for column in columns)
+    # Seeded rows don't collide with the existing IINs: patients start with '8', doctors with '7'.
+    prefix = "8" if model is Patient else "7"
+
+    if model is Patient:
+        query = text(
+            f'INSERT INTO patients ({column_list}, "IIN", doctor_id) '
+            f'SELECT {column_list}, :prefix || lpad((:start + series)::text, 11, \'0\'), '
+            f'doctor_ids.ids[1 + (:start + series) % cardinality(doctor_ids.ids)] '
+            f'FROM patients, generate_series(1, :batch_size) AS series, '
+            f'(SELECT array_agg(id) AS ids FROM doctors) AS doctor_ids '
+            f'WHERE patients.id = (SELECT min(id) FROM patients) '
+            f'ON CONFLICT DO NOTHING'
+        )
+    else:
+        query = text(
+            f'INSERT INTO {table} ({column_list}, "IIN") '
+            f'SELECT {column_list}, :prefix || lpad((:start + series)::text, 11, \'0\') '
+            f'FROM {table}, generate_series(1, :batch_size) AS series '
+            f'WHERE {table}.id = (SELECT min(id) FROM {table}) '
+            f'ON CONFLICT DO NOTHING'
+        )
+
+    async with async_session_maker() as session:
+        for start in range(0, count, SEED_BATCH_SIZE):
+            await session.execute(query, {"prefix": prefix, "start": start,
+                                          "batch_size": min(SEED_BATCH_SIZE, count - start)})
+            await session.commit()
+            print(f"seeded {table} {min(start + SEED_BATCH_SIZE, count)}/{count}")
+
+        await session.execute(text(f'ANALYZE {table}'))
+        await session.commit()
+
+
+def plan_nodes(plan: dict[str, Any]) -> Iterator[dict[str, Any]]:
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+async def capture_statements() -> list[tuple[str, str, Any]]:
+    """
+    This method is used to run the read methods of the repositories and to capture the statements they execute.
+    Changes are never committed, all the work is rolled back.
+
+    Returns:
+        (label, statement, parameters) of the executed statements (list[tuple[str, str, Any]])
+    """
+
+    captured: list[tuple[str, str, Any]] = []
+    label = ""
+
+    def capture(connection, cursor, statement, parameters, context, executemany) -> None:
+        if statement.lstrip().upper().startswith(("SELECT", "WITH", "UPDATE", "DELETE")):
+            captured.append((label, statement, parameters))
+
+    async with async_session_maker() as session:
+        doctor_id, doctor_IIN = (await session.execute(select(Doctor.id, Doctor.IIN).limit(1))).one()
+        patient_id, patient_IIN = (await session.execute(select(Patient.id, Patient.IIN).limit(1))).one()
+
+        patients = PatientRepository(session)
+        doctors = DoctorRepository(session)
+        refresh_tokens = RefreshTokenRepository(session)
+
+        calls: list[tuple[str, Callable[[], Awaitable[Any]]]] = [
+            ("patients.list", lambda: patients.get_patients(Pagination(1, 10), PATIENT_LIST_FIELDS)),
+            ("patients.list deep", lambda: patients.get_patients(Pagination(DEEP_PAGE, 10), PATIENT_LIST_FIELDS)),
+            ("patients.by_id", lambda: patients.get_patient_by_id(patient_id)),
+            ("patients.by_IIN", lambda: patients.get_patient_by_IIN(patient_IIN)),
+            ("patients.search name", lambda: patients.search_patients("иванов", Pagination(1, 10),
+                                                                      PATIENT_LIST_FIELDS)),
+            ("patients.search IIN", lambda: patients.search_patients(patient_IIN[:6], Pagination(1, 10),
+                                                                     PATIENT_LIST_FIELDS)),
+            ("doctors.list", lambda: doctors.get_doctors(Pagination(1, 10))),
+            ("doctors.by_id", lambda: doctors.get_doctor_by_id(doctor_id)),
+            ("doctors.by_IIN", lambda: doctors.get_doctor_by_IIN(doctor_IIN)),
+            ("doctors.search name", lambda: doctors.search_doctors("петров", Pagination(1, 10))),
+            ("doctors.patients", lambda: doctors.get_doctor_patients(doctor_id, Pagination(1, 10),
+                                                                     PATIENT_LIST_FIELDS)),
+            ("doctors.patients deep", lambda: doctors.get_doctor_patients(doctor_id, Pagination(DEEP_PAGE, 10),
+                                                                          PATIENT_LIST_FIELDS)),
+            ("refresh_tokens.revoked", lambda: refresh_tokens.get_revoked_refresh_tokens()),
+        ]
+
+        # Checks of the foreign keys, made by the DB on deleting or changing a referenced row.
+        for table in models_metadata.sorted_tables:
+            for foreign_key in table.foreign_keys:
+                referenced = select(foreign_key.column).limit(1).scalar_subquery()
+                query = select(literal(1)).where(foreign_key.parent == referenced).limit(1)
+                calls.append((f"{table.name}.{foreign_key.parent.name} foreign key",
+                              lambda query=query: session.execute(query)))
+
+        # Cached results would hide the queries.
+        patient_search_results.invalidate()
+        doctor_search_results.invalidate()
+
+        event.listen(engine.sync_engine, "before_cursor_execute", capture)
+        try:
+            for label, call in calls:
+                try:
+                    await call()
+                except HTTPException:
+                    # E.g. nothing is found, the statements are captured anyway.
+                    pass
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", capture)
+            await session.rollback()
+
+    return captured
+
+
+async def advise(min_rows: int) -> int:
+    """
+    This method is used to explain the captured statements and to print the sequential scans of large tables.
+
+    Returns:
+        number of statements reading large tables sequentially (int)
+    """
+
+    statements = await capture_statements()
+    reported = 0
+
+    async with engine.connect() as connection:
+        table_rows = dict((await connection.execute(
+            text("SELECT relname, reltuples FROM pg_class WHERE relkind = 'r'"))).all())
+
+        seen: set[tuple[str, str]] = set()
+        for label, statement, parameters in statements:
+            if (label, statement) in seen:
+                continue
+            seen.add((label, statement))
+
+            data = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+            plan = data.scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+
+            scanned = sorted({node["Relation Name"] for node in plan_nodes(plan[0]["Plan"])
+                              if node["Node Type"] == "Seq Scan"
+                              and table_rows.get(node["Relation Name"], 0) >= min_rows})
+            if scanned:
+                reported += 1
+            print(f"{label:<32} {'SEQ SCAN ' + ', '.join(scanned) if scanned else 'OK'}")
+            if scanned:
+                print(f"    {' '.join(statement.split())}")
+
+    return reported
+
+
+async def run(args: argparse.Namespace) -> None:
+    try:
+        if args.seed_doctors:
+            await seed(Doctor, args.seed_doctors)
+        if args.seed_patients:
+            await seed(Patient, args.seed_patients)
+
+        reported = await advise(args.min_rows)
+        print(f"{reported} statement(s) read large tables sequentially")
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Report repository queries, which read large tables sequentially.")
+    parser.add_argument("--seed-doctors", type=int, default=0, help="number of doctors inserted before checking")
+    parser.add_argument("--seed-patients", type=int, default=0, help="number of patients inserted before checking")
+    parser.add_argument("--min-rows", type=int, default=10000,
+                        help="sequential scans of tables with fewer (estimated) rows are ignored")
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
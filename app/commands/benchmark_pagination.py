@@ -0,0 +1,132 @@
+"""
+This command is used to compare latency of the paginated patient list, when the total is fetched by a separate
+'count' query (two round trips), by 'count(*) OVER ()' in the page query, and by the scalar count subquery used
+by the repositories ('fetch_page', one round trip). All strategies read the same page (ordered by 'id',
+with one extra row, as 'fetch_page' does), so they differ only in how the total is counted. The offset is rounded
+down to a multiple of the page size. For comparison, the 'estimate' total strategy (planner statistics instead
+of counting) is measured too.
+It runs against the DB from the environment config, and optionally fills the 'patients' table with copies
+of an existing patient first.
+
+Usage:
+    python -m app.commands.benchmark_pagination --seed 1000000 --iterations 50 --page-size 10
+"""
+import argparse
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+from sqlalchemy import Select, select, func, text
+
+from app.api.v1.repositories.pagination import fetch_page, SortKey
+from app.api.v1.services.pagination.pagination_service import Pagination
+from app.config.database import engine, async_session_maker
+from app.models.models import Patient
+
+SEED_BATCH_SIZE = 50000
+
+
+async def seed_patients(count: int) -> None:
+    """
+    This method is used to insert 'count' copies of the first patient with generated IINs.
+    """
+
+    columns = [column.name for column in Patient.__table__.columns if column.name not in ["id", "IIN"]]
+    column_list = ", ".join(f'"{column}"' for column in columns)
+    query = text(
+        f'INSERT INTO patients ({column_list}, "IIN") '
+        f'SELECT {column_list}, \'9\' || lpad((:start + series)::text, 11, \'0\') '
+        f'FROM patients, generate_series(1, :batch_size) AS series '
+        f'WHERE patients.id = (SELECT min(id) FROM patients) '
+        f'ON CONFLICT DO NOTHING'
+    )
+
+    async with async_session_maker() as session:
+        for start in range(0, count, SEED_BATCH_SIZE):
+            await session.execute(query, {"start": start, "batch_size": min(SEED_BATCH_SIZE, count - start)})
+            await session.commit()
+            print(f"seeded {min(start + SEED_BATCH_SIZE, count)}/{count}")
+
+
+def page_query(query: Select, offset: int, limit: int) -> Select:
+    return query.order_by(Patient.id).offset(offset).limit(limit + 1)
+
+
+async def count_then_page(offset: int, limit: int) -> None:
+    async with async_session_maker() as session:
+        total = await session.execute(select(func.count()).select_from(Patient))
+        total.scalar()
+        data = await session.execute(page_query(select(Patient), offset, limit))
+        data.all()
+
+
+async def windowed_page(offset: int, limit: int) -> None:
+    async with async_session_maker() as session:
+        data = await session.execute(page_query(select(Patient, func.count().over().label("total")), offset, limit))
+        data.all()
+
+
+async def subquery_page(offset: int, limit: int) -> None:
+    async with async_session_maker() as session:
+        await fetch_page(session, select(Patient), Pagination(offset // limit + 1, limit), [SortKey(Patient.id)])
+
+
+async def estimated_page(offset: int, limit: int) -> None:
+    async with async_session_maker() as session:
+        await fetch_page(session, select(Patient), Pagination(offset // limit + 1, limit, total_strategy="estimate"),
+                         [SortKey(Patient.id)])
+
+
+async def measure(strategy: Callable[[int, int], Awaitable[None]], iterations: int, offset: int,
+                  limit: int) -> tuple[float, float]:
+    """
+    This method is used to measure p50 and p99 latency (in milliseconds) of the given strategy.
+
+    Returns:
+        p50 and p99 latency in milliseconds (tuple[float, float])
+    """
+
+    # The first call prepares the statements and warms up the pool.
+    await strategy(offset, limit)
+
+    durations = []
+    for _ in range(iterations):
+        started_at = time.perf_counter()
+        await strategy(offset, limit)
+        durations.append((time.perf_counter() - started_at) * 1000)
+
+    durations.sort()
+    return durations[len(durations) // 2], durations[min(len(durations) - 1, int(round(0.99 * (len(durations) - 1))))]
+
+
+async def run(args: argparse.Namespace) -> None:
+    if args.seed:
+        await seed_patients(args.seed)
+    args.offset -= args.offset % args.page_size
+
+    strategies = [
+        ("count + page", count_then_page),
+        ("count(*) OVER ()", windowed_page),
+        ("count subquery", subquery_page),
+        ("estimated total", estimated_page),
+    ]
+    for name, strategy in strategies:
+        p50, p99 = await measure(strategy, args.iterations, args.offset, args.page_size)
+        print(f"{name:<18} p50={p50:8.1f} ms  p99={p99:8.1f} ms")
+
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare latency of paginated lists with different total queries.")
+    parser.add_argument("--seed", type=int, default=0, help="number of patients inserted before measuring")
+    parser.add_argument("--iterations", type=int, default=50, help="number of measured requests for every strategy")
+    parser.add_argument("--offset", type=int, default=0, help="offset of the requested page")
+    parser.add_argument("--page-size", type=int, default=10, help="number of patients on the requested page")
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
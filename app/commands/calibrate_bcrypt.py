@@ -0,0 +1,68 @@
+"""
+This command is used to pick the bcrypt cost (BCRYPT_ROUNDS) for the current host. It measures the time of
+hashing with increasing costs and recommends the highest one, which p99 fits the target latency.
+
+Usage:
+    python -m app.commands.calibrate_bcrypt --target-p99-ms 250 --samples 20
+"""
+import argparse
+import time
+
+from passlib.hash import bcrypt
+
+MIN_ROUNDS = 4
+MAX_ROUNDS = 16
+
+
+def measure_p99(rounds: int, samples: int) -> float:
+    """
+    This method is used to measure p99 time (in milliseconds) of hashing a password with the given bcrypt cost.
+
+    Returns:
+        p99 hash time in milliseconds (float)
+    """
+
+    hasher = bcrypt.using(rounds=rounds)
+    durations = []
+    for _ in range(samples):
+        started_at = time.perf_counter()
+        hasher.hash("calibration-password")
+        durations.append((time.perf_counter() - started_at) * 1000)
+
+    durations.sort()
+    return durations[min(len(durations) - 1, int(round(0.99 * (len(durations) - 1))))]
+
+
+def calibrate(target_p99_ms: float, samples: int) -> int:
+    """
+    This method is used to find the highest bcrypt cost, which p99 hash time fits the target.
+    Every next cost doubles the hash time, so the search stops at the first cost above the target.
+
+    Returns:
+        recommended bcrypt cost (int)
+    """
+
+    recommended_rounds = MIN_ROUNDS
+    for rounds in range(MIN_ROUNDS, MAX_ROUNDS + 1):
+        p99_ms = measure_p99(rounds, samples)
+        print(f"rounds={rounds:>2}  p99={p99_ms:8.1f} ms")
+
+        if p99_ms > target_p99_ms:
+            break
+        recommended_rounds = rounds
+
+    return recommended_rounds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pick the bcrypt cost that fits the target p99 hash latency.")
+    parser.add_argument("--target-p99-ms", type=float, default=250.0, help="target p99 hash time in milliseconds")
+    parser.add_argument("--samples", type=int, default=20, help="number of hashes measured for every cost")
+    args = parser.parse_args()
+
+    rounds = calibrate(args.target_p99_ms, args.samples)
+    print(f"\nRecommended setting: BCRYPT_ROUNDS={rounds}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+This command is used to check, that patient and doctor search is answered by the trigram and IIN indexes and doesn't
+fall back to a sequential scan. It explains the search conditions used by the repositories with sequential scans
+discouraged ('enable_seqscan = off'), so the result doesn't depend on the table size, and fails (exit code 1)
+if any plan still reads a table sequentially, e.g. when an index is missing or doesn't match the expression.
+
+Usage:
+    python -m app.commands.check_search_plans --query "иванов" --query "ivanov" --query "8701" --query "870101300123"
+"""
+import argparse
+import asyncio
+import json
+import sys
+from typing import Any, Iterator
+
+from sqlalchemy import select, text
+
+from app.api.v1.repositories.pagination import Explain
+from app.api.v1.repositories.search import search_condition, search_words
+from app.config.database import engine, async_session_maker
+from app.models.models import Patient, Doctor
+
+# Name search (Cyrillic and Latin), IIN prefix search and exact IIN lookup.
+DEFAULT_QUERIES = ["иванов", "ivanov", "8701", "870101300123", "иванов 8701"]
+
+
+def plan_nodes(plan: dict[str, Any]) -> Iterator[dict[str, Any]]:
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+async def check(queries: list[str]) -> bool:
+    """
+    This method is used to explain the search of patients and doctors by the given queries and to print the plans.
+
+    Returns:
+        True if no plan contains a sequential scan (bool)
+    """
+
+    passed = True
+    async with async_session_maker() as session:
+        await session.execute(text("SET LOCAL enable_seqscan = off"))
+
+        for query in queries:
+            words = search_words(query)
+            for model in [Patient, Doctor]:
+                data = await session.execute(Explain(select(model.id).where(search_condition(model, words))))
+                plan = data.scalar()
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+
+                node_types = [node["Node Type"] for node in plan_nodes(plan[0]["Plan"])]
+                seq_scan = "Seq Scan" in node_types
+                passed = passed and not seq_scan
+
+                print(f"{query!r:<22} {model.__tablename__:<10} {'FAIL' if seq_scan else 'OK':<5} "
+                      f"{' -> '.join(node_types)}")
+
+    return passed
+
+
+async def run(args: argparse.Namespace) -> bool:
+    try:
+        return await check(args.query or DEFAULT_QUERIES)
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check that search queries use indexes instead of sequential scans.")
+    parser.add_argument("--query", action="append", help="search query to explain (can be repeated)")
+    args = parser.parse_args()
+
+    if not asyncio.run(run(args)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,214 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+import asyncio
+import uuid
+from typing import Any, Callable, Sequence
+
+from sqlalchemy import select, text, Executable, event
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker, AsyncConnection, \
+    AsyncEngine
+from sqlalchemy.orm import Session
+
+from app.api.v1.services.metrics.metrics_service import metrics
+from app.config.env_config import DB_USER, DB_PASS, DB_HOST, DB_PORT, DB_NAME, DB_POOL_SIZE, DB_MAX_OVERFLOW, \
+    DB_POOL_TIMEOUT_SECONDS, DB_POOL_RECYCLE_SECONDS, DB_POOL_PRE_PING, DB_STATEMENT_CACHE_SIZE, DB_PGBOUNCER_MODE, \
+    DB_POOL_WARM_UP_SIZE, DB_REPLICA_HOST, DB_REPLICA_PORT, DB_REPLICA_MAX_LAG_SECONDS, \
+    DB_REPLICA_LAG_CHECK_INTERVAL_SECONDS
+from app.models.models import models_metadata, Patient, Doctor, Admin
+
+
+def get_connect_args() -> dict[str, Any]:
+    """
+    This method is used to build asyncpg connection arguments. In PgBouncer mode prepared statements can't be
+    reused between transactions, so both statement caches are disabled and statements get unique names.
+
+    Returns:
+        connection arguments (dict[str, Any])
+    """
+
+    if DB_PGBOUNCER_MODE:
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+
+    return {
+        "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+    }
+
+
+def create_engine(url: str) -> AsyncEngine:
+    return create_async_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=DB_POOL_RECYCLE_SECONDS,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args=get_connect_args(),
+    )
 
-from app.config.env_config import DB_USER, DB_PASS, DB_HOST, DB_PORT, DB_NAME
-from app.models.models import models_metadata
 
 DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-engine = create_async_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL)
 
 models_metadata.bind = engine
 
+metrics.register_gauge("db.pool.size", lambda: engine.pool.size())
+metrics.register_gauge("db.pool.checked_out", lambda: engine.pool.checkedout())
+metrics.register_gauge("db.pool.overflow", lambda: engine.pool.overflow())
+
 
 async def create_tables():
     async with engine.begin() as connection:
         await connection.run_sync(models_metadata.create_all)
 
 
+@event.listens_for(Session, "after_begin")
+def mark_connection_checked_out(session: Session, transaction, connection) -> None:
+    # Sessions check out a connection only when the first statement is executed.
+    session.info["connection_checked_out"] = True
+
+
+def record_session_checkout(session: AsyncSession) -> None:
+    """
+    This method is used to count sessions, which were closed without ever checking out a connection
+    (e.g. the request failed on a role check before any query).
+    """
+
+    if session.info.pop("connection_checked_out", False):
+        metrics.increment("db.sessions.checked_out")
+    else:
+        metrics.increment("db.sessions.checkout_saved")
+
+
+def after_commit(session: AsyncSession, callback: Callable[[], None]) -> None:
+    """
+    This method is used to run the callback (e.g. to update in-memory data derived from the DB) once the current
+    transaction of the session is committed. Callbacks are dropped if the transaction is rolled back.
+    """
+
+    session.info.setdefault("after_commit", []).append(callback)
+
+
+@event.listens_for(Session, "after_commit")
+def run_after_commit_callbacks(session: Session) -> None:
+    for callback in session.info.pop("after_commit", []):
+        callback()
+
+
+@event.listens_for(Session, "after_rollback")
+def drop_after_commit_callbacks(session: Session) -> None:
+    session.info.pop("after_commit", None)
+
+
 async_session_maker = async_sessionmaker(
     bind=engine,
     class_=AsyncSession,
     expire_on_commit=False
 )
+
+# Read replica is optional. When it isn't configured, all sessions are opened on the primary.
+replica_engine = None
+replica_session_maker = None
+if DB_REPLICA_HOST:
+    REPLICA_DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_REPLICA_HOST}:{DB_REPLICA_PORT}/{DB_NAME}"
+    replica_engine = create_engine(REPLICA_DATABASE_URL)
+    replica_session_maker = async_sessionmaker(
+        bind=replica_engine,
+        class_=AsyncSession,
+        expire_on_commit=False
+    )
+
+    metrics.register_gauge("db.replica_pool.checked_out", lambda: replica_engine.pool.checkedout())
+
+replica_lag_seconds: float | None = None
+metrics.register_gauge("db.replica.lag_seconds", lambda: replica_lag_seconds)
+
+
+async def monitor_replica_lag() -> None:
+    """
+    This method is used to periodically measure the replication lag of the read replica. When the lag can't be
+    measured, it's treated as unknown (None), and reads are routed to the primary.
+    The replica is caught up (the lag is 0), if it has replayed the WAL up to the position of the primary read just
+    before. Otherwise the lag is the time since the last replayed transaction, which keeps growing while the replica
+    doesn't replay anything (e.g. its WAL receiver is disconnected), so it becomes unavailable once the lag exceeds
+    DB_REPLICA_MAX_LAG_SECONDS. Positions of the received and replayed WAL aren't compared with each other: they're
+    also equal when the receiver is disconnected.
+    """
+
+    global replica_lag_seconds
+
+    while True:
+        try:
+            async with engine.connect() as connection:
+                data = await connection.execute(text("SELECT pg_current_wal_lsn()"))
+                primary_lsn = data.scalar()
+
+            async with replica_engine.connect() as connection:
+                data = await connection.execute(
+                    text("SELECT CASE WHEN pg_last_wal_replay_lsn() >= CAST(:primary_lsn AS pg_lsn) THEN 0 "
+                         "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"),
+                    {"primary_lsn": primary_lsn}
+                )
+                lag = data.scalar()
+                replica_lag_seconds = float(lag) if lag is not None else None
+        except Exception:
+            replica_lag_seconds = None
+            metrics.increment("db.replica.lag_check_failed")
+
+        await asyncio.sleep(DB_REPLICA_LAG_CHECK_INTERVAL_SECONDS)
+
+
+def read_lag_seconds(session: AsyncSession) -> float:
+    """
+    This method is used to get the maximum time, by which data read in the session may lag behind the primary
+    (the replica is used only while its lag doesn't exceed DB_REPLICA_MAX_LAG_SECONDS).
+
+    Returns:
+        lag in seconds (float)
+    """
+
+    if replica_engine is not None and session.bind is replica_engine:
+        return DB_REPLICA_MAX_LAG_SECONDS
+
+    return 0.0
+
+
+def is_replica_available() -> bool:
+    return replica_session_maker is not None and replica_lag_seconds is not None \
+        and replica_lag_seconds <= DB_REPLICA_MAX_LAG_SECONDS
+
+
+# Statements executed on every connection during warm-up, so they are prepared before the first request.
+# They must produce the same SQL as the queries used at login and on detail pages.
+HOT_STATEMENTS: Sequence[Executable] = [
+    select(Patient.id, Patient.IIN, Patient.hashed_password, Patient.doctor_id).where(Patient.IIN == ""),
+    select(Doctor.id, Doctor.IIN, Doctor.hashed_password).where(Doctor.IIN == ""),
+    select(Admin.id, Admin.username, Admin.hashed_password).where(Admin.username == ""),
+    select(Patient).where(Patient.id == 0),
+    select(Doctor).where(Doctor.id == 0),
+]
+
+
+async def warm_up_pool() -> None:
+    """
+    This method is used to open DB_POOL_WARM_UP_SIZE connections of the pool at startup and to prepare
+    the hot statements on each of them, so the first requests don't pay for connecting and planning.
+    In PgBouncer mode statements aren't cached, so only the connections are opened.
+    """
+
+    connections = []
+    try:
+        for _ in range(min(DB_POOL_WARM_UP_SIZE, DB_POOL_SIZE)):
+            connections.append(await engine.connect())
+
+        async def prepare(connection: AsyncConnection) -> None:
+            for statement in HOT_STATEMENTS:
+                await connection.execute(statement)
+
+        if not DB_PGBOUNCER_MODE:
+            await asyncio.gather(*(prepare(connection) for connection in connections))
+    finally:
+        for connection in connections:
+            await connection.close()
@@ -22,3 +22,93 @@ SECRET_KEY = os.environ.get('SECRET_KEY')
 ALGORITHM = os.environ.get('ALGORITHM')
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get('ACCESS_TOKEN_EXPIRE_MINUTES'))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.environ.get('REFRESH_TOKEN_EXPIRE_DAYS'))
+
+# Executor used for password hashing and verification ('thread' or 'process').
+PASSWORD_EXECUTOR_KIND = os.environ.get('PASSWORD_EXECUTOR_KIND', 'thread')
+PASSWORD_EXECUTOR_WORKERS = int(os.environ.get('PASSWORD_EXECUTOR_WORKERS', 4))
+
+# Maximum number of verified JWT payloads kept in memory.
+VERIFIED_TOKEN_CACHE_SIZE = int(os.environ.get('VERIFIED_TOKEN_CACHE_SIZE', 10000))
+
+# Usernames (or IINs) which are not found during login are remembered for this time to skip the DB lookup.
+UNKNOWN_USER_CACHE_TTL_SECONDS = int(os.environ.get('UNKNOWN_USER_CACHE_TTL_SECONDS', 30))
+UNKNOWN_USER_CACHE_SIZE = int(os.environ.get('UNKNOWN_USER_CACHE_SIZE', 10000))
+
+# Admission control for password checks at login.
+LOGIN_MAX_CONCURRENCY = int(os.environ.get('LOGIN_MAX_CONCURRENCY', 4))
+LOGIN_MAX_QUEUE = int(os.environ.get('LOGIN_MAX_QUEUE', 32))
+LOGIN_QUEUE_TIMEOUT_SECONDS = float(os.environ.get('LOGIN_QUEUE_TIMEOUT_SECONDS', 2))
+
+# Token-bucket throttling of login attempts per username and per client address.
+LOGIN_USERNAME_RATE_PER_MINUTE = float(os.environ.get('LOGIN_USERNAME_RATE_PER_MINUTE', 10))
+LOGIN_USERNAME_BURST = int(os.environ.get('LOGIN_USERNAME_BURST', 5))
+LOGIN_CLIENT_RATE_PER_MINUTE = float(os.environ.get('LOGIN_CLIENT_RATE_PER_MINUTE', 60))
+LOGIN_CLIENT_BURST = int(os.environ.get('LOGIN_CLIENT_BURST', 20))
+LOGIN_THROTTLE_MAX_KEYS = int(os.environ.get('LOGIN_THROTTLE_MAX_KEYS', 100000))
+
+# Cost factor of new bcrypt hashes. Use 'python -m app.commands.calibrate_bcrypt' to pick it for the host.
+# Hashes with another cost are rehashed on the next successful login.
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+
+# Revoked refresh tokens are kept in memory (Bloom filter backed by an exact set) and purged periodically.
+REVOKED_TOKENS_BLOOM_CAPACITY = int(os.environ.get('REVOKED_TOKENS_BLOOM_CAPACITY', 100000))
+REFRESH_TOKENS_PURGE_INTERVAL_SECONDS = int(os.environ.get('REFRESH_TOKENS_PURGE_INTERVAL_SECONDS', 3600))
+
+# Connection pool of the async engine.
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT_SECONDS = float(os.environ.get('DB_POOL_TIMEOUT_SECONDS', 30))
+DB_POOL_RECYCLE_SECONDS = int(os.environ.get('DB_POOL_RECYCLE_SECONDS', 1800))
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true'
+# Number of prepared statements cached by asyncpg per connection (0 disables the cache).
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get('DB_STATEMENT_CACHE_SIZE', 100))
+# Set to 'true' when connecting through PgBouncer in transaction pooling mode: disables prepared statement caches.
+DB_PGBOUNCER_MODE = os.environ.get('DB_PGBOUNCER_MODE', 'false').lower() == 'true'
+# Number of connections opened (and prepared with the hot statements) at startup.
+DB_POOL_WARM_UP_SIZE = int(os.environ.get('DB_POOL_WARM_UP_SIZE', 5))
+
+# Optional read replica. GET requests are served from it when it's configured.
+DB_REPLICA_HOST = os.environ.get('DB_REPLICA_HOST')
+DB_REPLICA_PORT = os.environ.get('DB_REPLICA_PORT', DB_PORT)
+# After a write, the user keeps reading from the primary for this time (read-your-writes).
+READ_YOUR_WRITES_SECONDS = float(os.environ.get('READ_YOUR_WRITES_SECONDS', 5))
+# Reads go to the primary while the replica lags behind more than this.
+DB_REPLICA_MAX_LAG_SECONDS = float(os.environ.get('DB_REPLICA_MAX_LAG_SECONDS', 10))
+DB_REPLICA_LAG_CHECK_INTERVAL_SECONDS = float(os.environ.get('DB_REPLICA_LAG_CHECK_INTERVAL_SECONDS', 5))
+
+# Strategy of computing totals of paginated lists: 'exact' (count on every page), 'estimate' (planner statistics)
+# or 'cached' (exact count, kept until the next write or for TOTAL_COUNT_CACHE_TTL_SECONDS).
+TOTAL_STRATEGIES = ["exact", "estimate", "cached"]
+
+
+def get_total_strategy(name):
+    # Unknown strategies fail the startup instead of every list request.
+    strategy = os.environ.get(name, 'exact')
+    if strategy not in TOTAL_STRATEGIES:
+        raise ValueError(f"{name} must be one of {', '.join(TOTAL_STRATEGIES)}, got '{strategy}'")
+    return strategy
+
+
+PATIENTS_TOTAL_STRATEGY = get_total_strategy('PATIENTS_TOTAL_STRATEGY')
+PATIENTS_SEARCH_TOTAL_STRATEGY = get_total_strategy('PATIENTS_SEARCH_TOTAL_STRATEGY')
+DOCTORS_TOTAL_STRATEGY = get_total_strategy('DOCTORS_TOTAL_STRATEGY')
+DOCTORS_SEARCH_TOTAL_STRATEGY = get_total_strategy('DOCTORS_SEARCH_TOTAL_STRATEGY')
+DOCTOR_PATIENTS_TOTAL_STRATEGY = get_total_strategy('DOCTOR_PATIENTS_TOTAL_STRATEGY')
+TOTAL_COUNT_CACHE_TTL_SECONDS = float(os.environ.get('TOTAL_COUNT_CACHE_TTL_SECONDS', 60))
+TOTAL_COUNT_CACHE_SIZE = int(os.environ.get('TOTAL_COUNT_CACHE_SIZE', 10000))
+
+# In-memory autocomplete indexes are rebuilt from the DB with this interval (0 disables), so every worker
+# sees changes made by other workers.
+AUTOCOMPLETE_REFRESH_INTERVAL_SECONDS = float(os.environ.get('AUTOCOMPLETE_REFRESH_INTERVAL_SECONDS', 300))
+# Maximum number of suggestions returned by autocomplete.
+AUTOCOMPLETE_MAX_LIMIT = int(os.environ.get('AUTOCOMPLETE_MAX_LIMIT', 50))
+
+# Ranked IDs of search results are cached per query and role, and dropped on every write (or after TTL).
+# Rankings of searches matching more than SEARCH_RESULT_CACHE_MAX_IDS rows aren't cached (only the fact, that they're
+# too large).
+SEARCH_RESULT_CACHE_SIZE = int(os.environ.get('SEARCH_RESULT_CACHE_SIZE', 1000))
+SEARCH_RESULT_CACHE_TTL_SECONDS = float(os.environ.get('SEARCH_RESULT_CACHE_TTL_SECONDS', 60))
+SEARCH_RESULT_CACHE_MAX_IDS = int(os.environ.get('SEARCH_RESULT_CACHE_MAX_IDS', 1000))
+
+# Maximum number of IDs deleted by one bulk delete request.
+BULK_DELETE_MAX_IDS = int(os.environ.get('BULK_DELETE_MAX_IDS', 10000))
@@ -1,22 +1,124 @@
-from fastapi import Depends
-from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Tuple
 
+from fastapi import Depends, HTTPException, Request
+from fastapi.security.utils import get_authorization_scheme_param
+from jose import JWTError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.api.v1.auth.auth import oauth2_scheme, verify_token
+from app.api.v1.auth.jwt.token_schema import Principal
 from app.api.v1.repositories.admin_repository import AdminRepository
 from app.api.v1.repositories.doctor_repository import DoctorRepository
 from app.api.v1.repositories.patient_repository import PatientRepository
 from app.api.v1.services.admin_service import AdminService
 from app.api.v1.services.doctor_service import DoctorService
 from app.api.v1.services.patient_service import PatientService
-from app.config.database import async_session_maker
+from app.api.v1.services.cache.cache_service import TTLCache
+from app.api.v1.services.metrics.metrics_service import metrics
+from app.config.database import async_session_maker, replica_session_maker, is_replica_available, \
+    record_session_checkout
+from app.config.env_config import READ_YOUR_WRITES_SECONDS
+
+# Users (role, subject), who have recently sent a write request. They read from the primary for a while,
+# so they see their own changes even if the replica lags behind.
+recent_writers = TTLCache("db.recent_writers", 100000, ttl=READ_YOUR_WRITES_SECONDS)
+
+
+def get_request_user(request: Request) -> Tuple[str, str] | None:
+    """
+    This method is used to identify the user of the request by the bearer token, without failing the request
+    when the token is missing or invalid (authentication is checked by 'get_current_principal').
+
+    Returns:
+        user role and subject (Tuple[str, str] | None)
+    """
+
+    scheme, token = get_authorization_scheme_param(request.headers.get("Authorization"))
+    if scheme.lower() != "bearer" or not token:
+        return None
+
+    try:
+        payload = verify_token(token)
+    except (HTTPException, JWTError):
+        return None
+
+    return payload.get("user_role"), payload.get("sub")
+
+
+def get_session_maker(request: Request, request_user: Tuple[str, str] | None) -> async_sessionmaker:
+    """
+    This method is used to choose the DB for the request: GET requests are served by the read replica, unless
+    it's unavailable (not configured or lagging) or the user has written something recently.
+
+    Returns:
+        session maker of the primary or of the replica (async_sessionmaker)
+    """
+
+    if request.method != "GET":
+        metrics.increment("db.routing.primary_write")
+        return async_session_maker
+
+    if not is_replica_available():
+        metrics.increment("db.routing.primary_replica_unavailable")
+        return async_session_maker
 
+    if request_user is not None and recent_writers.get(request_user):
+        metrics.increment("db.routing.primary_read_your_writes")
+        return async_session_maker
 
-async def get_async_session():
-    async with async_session_maker() as session:
+    metrics.increment("db.routing.replica")
+    return replica_session_maker
+
+
+async def get_async_session(request: Request):
+    """
+    This dependency is used to open the unit of work of the request: all the statements of the request run in one
+    transaction, which is committed once after the endpoint succeeded (before the response is sent), or rolled back
+    if it failed. Repositories only flush their changes.
+    """
+
+    request_user = get_request_user(request)
+    session_maker = get_session_maker(request, request_user)
+
+    # The session doesn't hold a connection until the first statement, so requests, which fail before querying
+    # the DB, don't take connections from the pool.
+    async with session_maker() as session:
         try:
             yield session
+
+            if session.in_transaction():
+                await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
         finally:
+            record_session_checkout(session)
             await session.close()
 
+    if request.method != "GET" and request_user is not None:
+        recent_writers.set(request_user, True)
+
+
+async def get_current_principal(token: str = Depends(oauth2_scheme)) -> Principal:
+    """
+    This dependency is used to resolve the authenticated user of the request from the bearer token.
+    The token is verified only once per request, and services receive the resolved principal.
+
+    Returns:
+        principal (Principal)
+
+    Raises:
+        HTTPException (401): If the token is invalid or expired.
+    """
+
+    try:
+        payload = verify_token(token)
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    return Principal(user_role=payload["user_role"], subject=payload["sub"], user_id=payload.get("user_id"),
+                     doctor_id=payload.get("doctor_id"))
+
 
 def get_admin_service(session: AsyncSession = Depends(get_async_session)) -> AdminService:
     admin_repository = AdminRepository(session)
@@ -1,3 +1,6 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
@@ -5,9 +8,35 @@ from starlette.middleware.cors import CORSMiddleware
 from app.api.v1.routers.patient_router import router as patient_router
 from app.api.v1.routers.admin_router import router as admin_router
 from app.api.v1.routers.doctor_router import router as doctor_router
+from app.api.v1.routers.metrics_router import router as metrics_router
 from app.api.v1.auth.auth_router import router as auth_router
+from app.api.v1.auth.jwt.revocation import load_revoked_tokens, purge_expired_refresh_tokens
+from app.api.v1.auth.password import password_executor
+from app.api.v1.services.autocomplete.autocomplete_service import load_autocomplete_indexes, \
+    refresh_autocomplete_indexes
+from app.config.database import warm_up_pool, replica_engine, monitor_replica_lag
+from app.config.env_config import AUTOCOMPLETE_REFRESH_INTERVAL_SECONDS
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await warm_up_pool()
+    await load_revoked_tokens()
+    await load_autocomplete_indexes()
+    background_tasks = [asyncio.create_task(purge_expired_refresh_tokens())]
+    if AUTOCOMPLETE_REFRESH_INTERVAL_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(refresh_autocomplete_indexes()))
+    if replica_engine is not None:
+        background_tasks.append(asyncio.create_task(monitor_replica_lag()))
+
+    yield
+
+    for task in background_tasks:
+        task.cancel()
+    password_executor.shutdown()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:3000",
@@ -25,6 +54,7 @@ app.include_router(patient_router)
 app.include_router(admin_router)
 app.include_router(doctor_router)
 app.include_router(auth_router)
+app.include_router(metrics_router)
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="localhost", port=8080, reload=True)
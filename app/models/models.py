@@ -1,6 +1,9 @@
-from sqlalchemy import Column, Integer, String, MetaData, ForeignKey, CheckConstraint, Enum, Numeric, ARRAY
+from sqlalchemy import Column, Integer, String, MetaData, ForeignKey, CheckConstraint, Enum, Numeric, ARRAY, DateTime, \
+    Index, event, text
 from sqlalchemy.orm import declarative_base, relationship
 
+from app.models.transliteration import search_name
+
 models_metadata = MetaData()
 Base = declarative_base(metadata=models_metadata)
 
@@ -14,6 +17,8 @@ class Patient(Base):
     last_name = Column(String(256), nullable=False)
     middle_name = Column(String(256), nullable=False)
     IIN = Column(String(12), nullable=False, unique=True)
+    # Lowercased and transliterated full name, maintained on every insert and update (see 'set_search_name')
+    search_name = Column(String, nullable=False)
     hashed_password = Column(String(1024), nullable=False, default=False)
     gender = Column(Enum('Мужской', 'Женский', name="genderEnum"), nullable=False, default=False)
     is_on_controlled = Column(Enum('Да', 'Нет', 'Нет данных', name="is_on_controlledEnum"), nullable=False)
@@ -133,6 +138,11 @@ class Patient(Base):
     doctor_id = Column(Integer, ForeignKey('doctors.id'), nullable=False)
     doctor = relationship("Doctor", back_populates="patients")
 
+    __table_args__ = (
+        # Doctor's patients ordered by ID, and the foreign key checks on deleting or changing ID of a doctor
+        Index('ix_patients_doctor_id_id', 'doctor_id', 'id'),
+    )
+
 
 class Doctor(Base):
     __tablename__ = 'doctors'
@@ -143,6 +153,8 @@ class Doctor(Base):
     last_name = Column(String(256), nullable=False)
     middle_name = Column(String(256), nullable=False)
     IIN = Column(String(12), nullable=False, unique=True)
+    # Lowercased and transliterated full name, maintained on every insert and update (see 'set_search_name')
+    search_name = Column(String, nullable=False)
     hashed_password = Column(String(1024), nullable=False, default=False)
     gender = Column(Enum('Мужской', 'Женский', name='genderEnum'), nullable=False, default=False)
     age = Column(Integer, CheckConstraint('age >= 0 AND age <= 120'), nullable=False)
@@ -150,6 +162,14 @@ class Doctor(Base):
     patients = relationship("Patient", back_populates="doctor")
 
 
+@event.listens_for(Patient, "before_insert")
+@event.listens_for(Patient, "before_update")
+@event.listens_for(Doctor, "before_insert")
+@event.listens_for(Doctor, "before_update")
+def set_search_name(mapper, connection, target: Patient | Doctor) -> None:
+    target.search_name = search_name(target.first_name, target.last_name, target.middle_name)
+
+
 class Admin(Base):
     __tablename__ = 'admins'
     metadata = models_metadata
@@ -160,3 +180,20 @@ class Admin(Base):
     middle_name = Column(String(256), nullable=False)
     username = Column(String(256), nullable=False, unique=True)
     hashed_password = Column(String(1024), nullable=False, default=False)
+
+
+class RefreshToken(Base):
+    __tablename__ = 'refresh_tokens'
+    metadata = models_metadata
+
+    # jti - JWT ID of the refresh token
+    jti = Column(String(36), primary_key=True)
+    subject = Column(String(256), nullable=False)
+    user_role = Column(String(32), nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    revoked_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Revoked tokens, loaded at startup (most tokens are never revoked)
+        Index('ix_refresh_tokens_revoked_expires_at', 'expires_at', postgresql_where=text('revoked_at IS NOT NULL')),
+    )
@@ -0,0 +1,55 @@
+"""
+Normalization of names for search. Names are stored in Cyrillic (Russian and Kazakh), but are often typed in Latin
+transliteration, so both the stored names and the search words are brought to the same Latin form.
+"""
+
+import re
+
+# Russian letters follow the passport (ICAO) transliteration, Kazakh letters are mapped to the closest Latin letter.
+CYRILLIC_TO_LATIN = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh", "з": "z", "и": "i",
+    "й": "i", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t",
+    "у": "u", "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "shch", "ъ": "", "ы": "y", "ь": "",
+    "э": "e", "ю": "iu", "я": "ia",
+    "ә": "a", "ғ": "g", "қ": "k", "ң": "n", "ө": "o", "ұ": "u", "ү": "u", "һ": "h", "і": "i",
+}
+
+# Latin spellings with several common variants, folded to one of them in this order (patterns are regular
+# expressions), e.g. 'Yuliya', 'Yulia' and 'Iuliia', 'Khan' and 'Han', 'Yerlan' and 'Erlan', 'Fyodor' and 'Fedor',
+# 'Alexander' and 'Aleksandr'. 'ye' and 'yo' stand for 'е' and 'ё' ('Sergeyev', 'Pyotr'), 'ii' for 'ий' and 'ия'
+# ('Dmitriy', 'Mariya'). Transliterated Cyrillic names (almost) never contain 'x', 'ye', 'yo' or a leading 'ie', so
+# these folds don't change them, and folding 'ii' keeps every typed prefix of a name a prefix of it (autocomplete).
+LATIN_FOLDS = [(re.compile(pattern), replacement) for pattern, replacement in [
+    ("xander", "ksandr"), ("x", "ks"), ("kh", "h"), ("ye", "e"), ("yo", "e"), ("y", "i"), ("ii", "i"),
+    (r"\bie", "e"), ("w", "v"), ("q", "k"),
+]]
+
+TRANSLITERATION_TABLE = str.maketrans(CYRILLIC_TO_LATIN)
+
+
+def normalize_name(value: str) -> str:
+    """
+    This method is used to normalize a name or a search word: it's lowercased, transliterated to Latin and common
+    variants of Latin spelling are folded, e.g. 'Юлия', 'Yuliya' and 'Yulia' are all normalized to 'iulia'.
+    Digits (IIN) are kept as is.
+
+    Returns:
+        normalized value (str)
+    """
+
+    normalized = value.strip().lower().translate(TRANSLITERATION_TABLE)
+    for variant, replacement in LATIN_FOLDS:
+        normalized = variant.sub(replacement, normalized)
+
+    return normalized
+
+
+def search_name(first_name: str, last_name: str, middle_name: str) -> str:
+    """
+    This method is used to build the value of the stored 'search_name' column of patients and doctors.
+
+    Returns:
+        normalized full name (str)
+    """
+
+    return " ".join(normalize_name(name) for name in (first_name, last_name, middle_name) if name)
@@ -1,6 +1,6 @@
-from typing import List
+from typing import List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, create_model, model_validator
 
 
 class PatientRead(BaseModel):
@@ -361,12 +361,68 @@ class PatientUpdateHashedPassword(BaseModel):
     doctor_id: int
 
 
+class PatchModel(BaseModel):
+    """
+    Base of partial updates (PATCH): every field may be omitted, and only the given fields are updated
+    ('model_dump(exclude_unset=True)'). Given fields can't be null, because all the updated columns are required.
+    """
+
+    @model_validator(mode="after")
+    def check_not_null(self):
+        null_fields = [name for name in self.model_fields_set if getattr(self, name) is None]
+        if null_fields:
+            raise ValueError(f"Fields can't be null: {', '.join(sorted(null_fields))}")
+
+        return self
+
+
+def optional_model(name: str, model: type[BaseModel], base: type[BaseModel] = BaseModel) -> type[BaseModel]:
+    return create_model(
+        name,
+        __base__=base,
+        **{field_name: (Optional[field.annotation], None) for field_name, field in model.model_fields.items()}
+    )
+
+
+def patch_model(name: str, model: type[BaseModel]) -> type[PatchModel]:
+    return optional_model(name, model, PatchModel)
+
+
+PatientPatch = patch_model("PatientPatch", PatientUpdateRawPassword)
+# Result of a partial update: ID and the updated fields only (returned with 'response_model_exclude_unset').
+PatientPatchResult = optional_model("PatientPatchResult", PatientRead)
+
+
 class PatientPaginationResult(BaseModel):
     page: int
     page_size: int
     total: int
     total_pages: int
+    # 'exact', 'estimate' or 'cached', so UIs can show approximate totals accordingly
+    total_strategy: str = "exact"
     data: List[PatientRead]
+    next_cursor: str | None = None
+    prev_cursor: str | None = None
+
+
+# Fields of patients in lists, when the 'fields' parameter isn't given.
+PATIENT_LIST_FIELDS = ["id", "first_name", "last_name", "middle_name", "IIN", "gender", "age", "doctor_id"]
+
+# Patient in lists. Only the requested fields (PATIENT_LIST_FIELDS by default) are loaded and returned,
+# so every field of 'PatientRead' is optional here.
+PatientListItem = optional_model("PatientListItem", PatientRead)
+
+
+class PatientListPaginationResult(BaseModel):
+    page: int
+    page_size: int
+    total: int
+    total_pages: int
+    # 'exact', 'estimate' or 'cached', so UIs can show approximate totals accordingly
+    total_strategy: str = "exact"
+    data: List[PatientListItem]
+    next_cursor: str | None = None
+    prev_cursor: str | None = None
 
 
 class DoctorRead(BaseModel):
@@ -429,12 +485,20 @@ class DoctorUpdateHashedPassword(BaseModel):
     age: int
 
 
+DoctorPatch = patch_model("DoctorPatch", DoctorUpdateRawPassword)
+DoctorPatchResult = optional_model("DoctorPatchResult", DoctorRead)
+
+
 class DoctorPaginationResult(BaseModel):
     page: int
     page_size: int
     total: int
     total_pages: int
+    # 'exact', 'estimate' or 'cached', so UIs can show approximate totals accordingly
+    total_strategy: str = "exact"
     data: List[DoctorRead]
+    next_cursor: str | None = None
+    prev_cursor: str | None = None
 
 
 class AdminRead(BaseModel):
@@ -475,3 +539,25 @@ class AdminUpdateHashedPassword(BaseModel):
     middle_name: str
     username: str
     hashed_password: str
+
+
+AdminPatch = patch_model("AdminPatch", AdminUpdateRawPassword)
+AdminPatchResult = optional_model("AdminPatchResult", AdminRead)
+
+
+class AutocompleteItem(BaseModel):
+    id: int
+    first_name: str
+    last_name: str
+    middle_name: str
+    IIN: str
+
+
+class BulkDeleteRequest(BaseModel):
+    ids: List[int]
+
+
+class BulkDeleteResult(BaseModel):
+    deleted_ids: List[int]
+    # Requested IDs, which don't exist (e.g. were already deleted)
+    not_found_ids: List[int]